@@ -0,0 +1,66 @@
+"""
+Проверка записи CSV кадра в обе стороны и сравнение скорости с pandas to_csv.
+
+Запуск: python benchmarks/bench_csv_writer.py [--width 1920] [--height 1080]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_frame import csv_to_array  # noqa: E402
+from csv_writer import write_csv_frame, pack_rgb  # noqa: E402
+
+
+def write_with_pandas(data, file_path):
+    """
+    Запись того же формата через pandas to_csv (для сравнения).
+    """
+    header = '# rgb\n' if data.ndim == 3 else '# grayscale\n'
+    values = pack_rgb(data) if data.ndim == 3 else data
+    with open(file_path, 'w') as file:
+        file.write(header)
+        pd.DataFrame(values).to_csv(file, sep=';', header=False, index=False)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Скорость записи CSV кадра')
+    parser.add_argument('--width', type=int, default=1920, help='Ширина кадра')
+    parser.add_argument('--height', type=int, default=1080, help='Высота кадра')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = {
+        'grayscale': rng.integers(0, 256, (args.height, args.width), dtype=np.uint8),
+        'rgb': rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for name, data in frames.items():
+            for extension in ('.csv', '.csv.gz'):
+                file_path = os.path.join(directory, name + extension)
+                elapsed = timed(write_csv_frame, data, file_path)
+                assert np.array_equal(csv_to_array(file_path), data), f"{name}{extension}: кадр не совпадает"
+                size = os.path.getsize(file_path) / 2 ** 20
+                print(f"{name + extension:<18} write_csv_frame {elapsed * 1000:8.1f} мс, {size:6.1f} МБ")
+
+            pandas_path = os.path.join(directory, name + '_pandas.csv')
+            elapsed = timed(write_with_pandas, data, pandas_path)
+            with open(pandas_path, 'rb') as pandas_file, open(os.path.join(directory, name + '.csv'), 'rb') as file:
+                assert pandas_file.read() == file.read(), f"{name}: вывод отличается от pandas"
+            print(f"{name + '.csv':<18} pandas to_csv   {elapsed * 1000:8.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Замер масштабирования пула декодирования на 1, 2, 4 и N ядрах.
+
+Запуск: python benchmarks/bench_decode_pool.py [каталог с CSV] [--repeat K]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decode_pool import DecodePool  # noqa: E402
+
+
+def run(file_paths, workers):
+    """
+    Декодирование всех файлов пулом заданного размера.
+    :param file_paths: Список путей к CSV файлам
+    :param workers: Количество процессов
+    :return: Время декодирования в секундах (без запуска процессов)
+    """
+    with DecodePool(max_workers=workers) as pool:
+        # Прогрев: запуск процессов не входит в замер
+        for frame in pool.decode(file_paths[:workers]):
+            frame.release()
+
+        start = time.perf_counter()
+        for frame in pool.decode(file_paths):
+            frame.attach()  # Подключение к кадру без копирования
+            frame.release()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Масштабирование пула декодирования CSV')
+    default_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'attached_data')
+    parser.add_argument('directory', nargs='?', default=default_dir, help='Каталог с CSV кадрами')
+    parser.add_argument('--repeat', type=int, default=4, help='Сколько раз повторить список файлов')
+    args = parser.parse_args()
+
+    file_paths = sorted(glob.glob(os.path.join(args.directory, '**', '*.csv'), recursive=True)) * args.repeat
+    if not file_paths:
+        print(f"В каталоге {args.directory} нет CSV файлов.")
+        return
+
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({count for count in (1, 2, 4, cores) if count <= cores})
+    print(f"Кадров: {len(file_paths)}, ядер: {cores}")
+
+    baseline = None
+    for workers in worker_counts:
+        elapsed = run(file_paths, workers)
+        baseline = baseline or elapsed
+        print(f"{workers:>3} процесс(ов): {elapsed:7.2f} с, {len(file_paths) / elapsed:7.2f} кадр/с, "
+              f"ускорение x{baseline / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
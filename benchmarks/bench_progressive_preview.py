@@ -0,0 +1,65 @@
+"""
+Время до первого изображения: уменьшенная копия без индекса строк и с индексом из кэша
+против полного разбора.
+
+Запуск: python benchmarks/bench_progressive_preview.py [CSV файл ...] [--rows 256]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_frame import csv_to_array  # noqa: E402
+from csv_index import RowIndex, cache_row_index, read_sampled_preview  # noqa: E402
+
+
+def sampled_preview(file_path, rows):
+    """
+    Уменьшенная копия без индекса строк (первый показ файла в окне просмотра).
+    :return: Время в секундах
+    """
+    start = time.perf_counter()
+    read_sampled_preview(file_path, rows)
+    return time.perf_counter() - start
+
+
+def indexed_preview(file_path, cache_dir, rows):
+    """
+    Уменьшенная копия через индекс строк из кэша (повторный показ файла).
+    :return: Время в секундах
+    """
+    start = time.perf_counter()
+    with RowIndex.load_cached(file_path, cache_dir) as row_index:
+        row_index.read_preview(max(2, row_index.height // rows))
+    return time.perf_counter() - start
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Время до первого изображения')
+    parser.add_argument('files', nargs='*', help='CSV файлы (по умолчанию - attached_data)')
+    parser.add_argument('--rows', type=int, default=256, help='Количество строк в уменьшенной копии')
+    args = parser.parse_args()
+    files = args.files or sorted(glob.glob(os.path.join(root, 'attached_data', '**', '*.csv'), recursive=True))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for file_path in files:
+            cold = sampled_preview(file_path, args.rows)
+            start = time.perf_counter()
+            cache_row_index(file_path, cache_dir)  # В окне просмотра выполняется в фоновом процессе
+            build = time.perf_counter() - start
+            warm = indexed_preview(file_path, cache_dir, args.rows)
+            start = time.perf_counter()
+            csv_to_array(file_path)
+            full = time.perf_counter() - start
+            print(f"{os.path.basename(file_path):<24} полный разбор {full * 1000:7.1f} мс, "
+                  f"копия без индекса {cold * 1000:6.1f} мс ({cold / full:.0%}), "
+                  f"копия с кэшем индекса {warm * 1000:6.1f} мс ({warm / full:.0%}), "
+                  f"фоновое построение индекса {build * 1000:6.1f} мс")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Сравнение чтения области 512x512 через индекс строк с полным разбором кадра.
+
+Запуск: python benchmarks/bench_row_index.py [CSV файл] [--size N]
+Без указания файла создается временный градационный кадр N x N.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_frame import csv_to_array  # noqa: E402
+from csv_index import RowIndex  # noqa: E402
+
+
+def make_frame(directory, size):
+    """
+    Создание случайного градационного CSV кадра.
+    :param directory: Каталог для файла
+    :param size: Размер стороны кадра
+    :return: Путь к файлу
+    """
+    file_path = os.path.join(directory, f'frame_{size}.csv')
+    data = np.random.default_rng(0).integers(0, 256, (size, size))
+    with open(file_path, 'w') as file:
+        file.write('# grayscale\n')
+        np.savetxt(file, data, fmt='%d', delimiter=';')
+    return file_path
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Чтение области кадра через индекс строк')
+    parser.add_argument('file', nargs='?', help='CSV файл (по умолчанию создается временный)')
+    parser.add_argument('--size', type=int, default=6000, help='Размер временного кадра')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = args.file or make_frame(directory, args.size)
+        print(f"Файл: {file_path}, {os.path.getsize(file_path) / 2 ** 20:.1f} МБ")
+
+        index, build_time = timed(RowIndex.load, file_path, directory)
+        _, cached_time = timed(RowIndex.load, file_path, directory)
+        top, left = index.height // 3, index.width // 3
+        region, region_time = timed(index.read_region, top, left, 512, 512)
+        rows = np.random.default_rng(1).permutation(index.height)[:512]
+        _, random_time = timed(index.read_rows, rows, left, left + 512)
+        full, full_time = timed(csv_to_array, file_path)
+        index.close()
+
+        assert np.array_equal(region, full[top:top + 512, left:left + 512])
+        print(f"Построение индекса:        {build_time * 1000:9.1f} мс")
+        print(f"Загрузка индекса из кэша:  {cached_time * 1000:9.1f} мс")
+        print(f"Область 512x512:           {region_time * 1000:9.1f} мс")
+        print(f"512 случайных строк:       {random_time * 1000:9.1f} мс")
+        print(f"Полный разбор кадра:       {full_time * 1000:9.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Скорость потокового экспорта слайд-шоу в APNG, GIF и последовательность кадров.
+
+Запуск: python benchmarks/bench_slideshow_export.py [--frames N] [--width W] [--height H]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slideshow_export import export_frames  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Скорость экспорта слайд-шоу')
+    parser.add_argument('--frames', type=int, default=1000, help='Количество кадров')
+    parser.add_argument('--width', type=int, default=640, help='Ширина кадра')
+    parser.add_argument('--height', type=int, default=480, help='Высота кадра')
+    args = parser.parse_args()
+
+    # Несколько различных кадров, повторенных до нужной длины последовательности
+    rng = np.random.default_rng(0)
+    gradient = np.add.outer(np.arange(args.height), np.arange(args.width))
+    base = [Image.fromarray(np.uint8((gradient + shift + rng.integers(0, 8, gradient.shape)) % 256), 'L')
+            for shift in range(0, 256, 16)]
+    images = [base[i % len(base)] for i in range(args.frames)]
+    color_map = np.stack([np.arange(256), np.arange(256)[::-1], np.full(256, 128)], axis=1).astype(np.uint8)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for export_format, extension in (('apng', '.png'), ('gif', '.gif'), ('sequence', '.png')):
+            for mapped in (None, color_map):
+                file_path = os.path.join(directory, f'{export_format}{extension}')
+                start = time.perf_counter()
+                export_frames(images, file_path, export_format, 100, color_map=mapped)
+                elapsed = time.perf_counter() - start
+                label = f"{export_format}{' + цветовая карта' if mapped is not None else ''}"
+                print(f"{label:<26} {elapsed:7.2f} с, {args.frames / elapsed:8.1f} кадр/с")
+
+
+if __name__ == '__main__':
+    main()
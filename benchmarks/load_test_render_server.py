@@ -0,0 +1,115 @@
+"""
+Нагрузочный тест сервера кадров: запросы в секунду и задержки p50/p99.
+
+Запуск: python benchmarks/load_test_render_server.py [--url http://127.0.0.1:8765] [--clients 8]
+Без --url сервер запускается в этом же процессе над каталогом attached_data.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from render_server import create_server  # noqa: E402
+
+
+def client(host, port, paths, deadline, latencies, errors):
+    """
+    Клиент с постоянным соединением, отправляющий запросы до истечения времени.
+    :param host: Адрес сервера
+    :param port: Порт сервера
+    :param paths: Список путей запросов
+    :param deadline: Время окончания теста (time.perf_counter)
+    :param latencies: Список для записи задержек
+    :param errors: Список для записи ошибок
+    """
+    connection = http.client.HTTPConnection(host, port)
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест сервера кадров')
+    parser.add_argument('--url', help='Адрес запущенного сервера (по умолчанию - локальный экземпляр)')
+    parser.add_argument('--root', default=os.path.join(ROOT, 'attached_data'), help='Каталог кадров')
+    parser.add_argument('--clients', type=int, default=8, help='Количество одновременных клиентов')
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность теста в секундах')
+    args = parser.parse_args()
+
+    server = None
+    index_cache = tempfile.TemporaryDirectory()  # Индексы строк не записываются рядом с кадрами
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server = create_server(args.root, port=0, index_cache_dir=index_cache.name)
+        host, port = server.server_address
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    frames = []
+    for directory, _, files in os.walk(args.root):
+        frames.extend(quote(os.path.relpath(os.path.join(directory, name), args.root))
+                      for name in files if name.endswith('.csv'))
+    paths = []
+    for frame in frames:
+        paths += [f'/frame/{frame}?format=raw', f'/colormap/{frame}', f'/preview/{frame}?size=256',
+                  f'/tile/{frame}?x=256&y=256&w=256&h=256&format=raw']
+
+    # Прогрев кэша, чтобы измерять работу сервера, а не первичное декодирование
+    connection = http.client.HTTPConnection(host, port)
+    for path in paths:
+        connection.request('GET', path)
+        connection.getresponse().read()
+    connection.close()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client, args=(host, port, paths, deadline, latencies, errors))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    index_cache.cleanup()
+
+    if not latencies:
+        print(f"Нет успешных запросов, ошибок: {len(errors)}")
+        return
+    latencies = np.array(latencies) * 1000
+    print(f"Клиентов: {args.clients}, запросов: {len(latencies)}, ошибок: {len(errors)}")
+    print(f"Запросов в секунду: {len(latencies) / elapsed:.1f}")
+    print(f"Задержка p50: {np.percentile(latencies, 50):.1f} мс, p99: {np.percentile(latencies, 99):.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
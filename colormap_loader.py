@@ -0,0 +1,29 @@
+import io
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QFile, QIODevice
+import colormap  # noqa: F401 - регистрация ресурсов Qt с цветовой картой
+
+DEFAULT_COLOR_MAP = ":/colormap/CET-R1.csv"
+
+
+def load_color_map(colormap_path=DEFAULT_COLOR_MAP):
+    """
+    Загрузка цветовой карты из файла или ресурсов Qt.
+    Цветовая карта используется для преобразования градационных изображений в цветные.
+    :param colormap_path: Путь к файлу цветовой карты
+    :return: Массив (256, 3) типа uint8 или None, если карту не удалось загрузить
+    """
+    file = QFile(colormap_path)
+    if not file.open(QIODevice.ReadOnly):  # Попытка открыть файл для чтения
+        print("Не удалось открыть файл цветовой карты.")
+        return None
+    try:
+        df = pd.read_csv(io.BytesIO(bytes(file.readAll())), delimiter=',', header=None)  # Чтение CSV файла с цветовой картой
+        return df.values.astype(np.uint8)  # Преобразование данных в формат numpy array
+    except Exception as e:
+        print(f"Ошибка при загрузке цветовой карты: {e}")
+        return None
+    finally:
+        file.close()
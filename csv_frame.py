@@ -0,0 +1,83 @@
+import bz2
+import gzip
+import lzma
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+
+def open_csv(file_path):
+    """
+    Открытие CSV файла для чтения, в том числе сжатого (.gz, .bz2, .xz).
+    :param file_path: Путь к CSV файлу
+    :return: Открытый текстовый файл
+    """
+    for extension, opener in COMPRESSED_OPENERS.items():
+        if file_path.endswith(extension):
+            return opener(file_path, 'rt')
+    return open(file_path, 'r')
+
+
+def read_csv_header(file):
+    """
+    Определение формата CSV файла по строке заголовка.
+    Если первая строка не является заголовком, позиция в файле не меняется.
+    :param file: Открытый текстовый файл
+    :return: 'rgb' или 'grayscale'
+    """
+    position = file.tell()
+    first_line = file.readline().strip()  # Чтение первой строки для определения формата
+    if not first_line.startswith('#'):
+        file.seek(position)  # Заголовка нет - первая строка содержит данные
+        return 'grayscale'
+    return 'rgb' if first_line == '# rgb' else 'grayscale'
+
+
+def unpack_rgb(data):
+    """
+    Распаковка целых чисел вида 0xRRGGBB в массив RGB.
+    :param data: Двумерный массив упакованных значений
+    :return: Массив numpy формы (height, width, 3) типа uint8
+    """
+    data = data.astype(np.uint32, copy=False)
+    rgb_data = np.empty(data.shape + (3,), dtype=np.uint8)
+    rgb_data[..., 0] = data >> 16  # Красный канал
+    rgb_data[..., 1] = data >> 8  # Зеленый канал
+    rgb_data[..., 2] = data  # Синий канал
+    return rgb_data
+
+
+def csv_to_array(file_path):
+    """
+    Чтение CSV файла в массив пикселей.
+    :param file_path: Путь к CSV файлу
+    :return: Массив numpy формы (height, width) для градационных изображений
+             или (height, width, 3) для RGB, тип uint8
+    """
+    with open_csv(file_path) as file:
+        frame_format = read_csv_header(file)
+        df = pd.read_csv(file, delimiter=';', header=None)  # Чтение данных CSV
+
+    data = df.values
+    if frame_format == 'rgb':
+        return unpack_rgb(data)
+    return np.uint8(data)
+
+
+def array_to_image(data):
+    """
+    Преобразование массива пикселей в изображение PIL.
+    :param data: Массив формы (height, width) или (height, width, 3) типа uint8
+    :return: Объект изображения PIL
+    """
+    if data.ndim == 3:
+        return Image.fromarray(data, 'RGB')  # Создание изображения RGB
+    return Image.fromarray(data, 'L')  # Создание градационного изображения
@@ -0,0 +1,366 @@
+import os
+import mmap
+import hashlib
+import tempfile
+
+import numpy as np
+
+from csv_frame import unpack_rgb
+
+SEPARATOR = ord(';')
+NEWLINE = ord('\n')
+
+
+def parse_tokens(buffer, n_rows, n_cols):
+    """
+    Векторный разбор целых чисел из буфера, где каждое число завершается ';' или переводом строки.
+    :param buffer: Байтовая строка с n_rows * n_cols числами
+    :param n_rows: Количество строк
+    :param n_cols: Количество чисел в строке
+    :return: Массив int64 формы (n_rows, n_cols)
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = np.flatnonzero((data == SEPARATOR) | (data == NEWLINE))
+    if len(ends) != n_rows * n_cols:
+        raise ValueError("Количество значений в строках CSV не совпадает с ожидаемым.")
+    if not len(ends):
+        return np.zeros((n_rows, n_cols), dtype=np.int64)  # Пустой запрос
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    values = np.zeros(len(ends), dtype=np.int64)
+    max_length = int((ends - starts).max()) if len(ends) else 0
+    for k in range(max_length):  # Цикл по разрядам, а не по значениям
+        position = starts + k
+        inside = position < ends
+        digit = data[np.minimum(position, len(data) - 1)].astype(np.int64) - ord('0')
+        valid = inside & (digit >= 0) & (digit <= 9)  # Пробелы и '\r' пропускаются
+        values = np.where(valid, values * 10 + digit, values)
+    return values.reshape(n_rows, n_cols)
+
+
+class RowIndex:
+    """
+    Индекс смещений строк CSV кадра.
+    Хранит байтовые смещения начала и конца каждой строки, а также смещения
+    каждого stride-го столбца внутри строки, что позволяет читать только
+    нужные строки и окно столбцов без разбора всего файла.
+    """
+
+    CACHE_SUFFIX = '.rowidx.npz'
+    CACHE_VERSION = 1
+
+    def __init__(self, file_path, frame_format, width, row_starts, row_ends, checkpoints, stride):
+        """
+        :param file_path: Путь к CSV файлу
+        :param frame_format: 'rgb' или 'grayscale'
+        :param width: Количество столбцов кадра
+        :param row_starts: Смещения начала строк данных
+        :param row_ends: Смещения конца строк данных (позиция перевода строки)
+        :param checkpoints: Смещения столбцов 0, stride, 2*stride... относительно начала строки
+        :param stride: Шаг контрольных столбцов
+        """
+        self.file_path = file_path
+        self.frame_format = frame_format
+        self.width = width
+        self.row_starts = row_starts
+        self.row_ends = row_ends
+        self.checkpoints = checkpoints
+        self.stride = stride
+        self._file = None
+        self._mmap = None
+
+    @property
+    def height(self):
+        return len(self.row_starts)
+
+    @classmethod
+    def build(cls, file_path, stride=256, block_size=8 * 1024 * 1024):
+        """
+        Построение индекса за один проход по файлу блоками.
+        :param file_path: Путь к CSV файлу
+        :param stride: Шаг контрольных столбцов
+        :param block_size: Размер блока чтения в байтах
+        :return: Объект RowIndex
+        """
+        row_starts, row_ends, checkpoints = [], [], []
+        width = None
+        with open(file_path, 'rb') as file:
+            first_line = file.readline()
+            if first_line.startswith(b'#'):
+                frame_format = 'rgb' if first_line.strip() == b'# rgb' else 'grayscale'
+                offset = len(first_line)
+            else:
+                frame_format = 'grayscale'  # Заголовка нет - первая строка содержит данные
+                offset = 0
+                file.seek(0)
+
+            carry = b''
+            while True:
+                chunk = file.read(block_size)
+                if not chunk:
+                    if carry.strip():
+                        carry += b'\n'  # Последняя строка без перевода строки
+                    else:
+                        break
+                buffer = carry + chunk
+                cut = buffer.rfind(b'\n') + 1
+                if cut == 0:
+                    carry = buffer
+                    continue
+                width = cls._index_block(buffer[:cut], offset, stride, width,
+                                         row_starts, row_ends, checkpoints)
+                offset += cut
+                carry = buffer[cut:]
+                if not chunk:
+                    break
+
+        if width is None:
+            raise ValueError(f"Файл {file_path} не содержит данных.")
+        return cls(file_path, frame_format, width,
+                   np.concatenate(row_starts), np.concatenate(row_ends),
+                   np.concatenate(checkpoints), stride)
+
+    @staticmethod
+    def _index_block(block, offset, stride, width, row_starts, row_ends, checkpoints):
+        """
+        Индексация блока, состоящего из целых строк.
+        :return: Количество столбцов кадра
+        """
+        data = np.frombuffer(block, dtype=np.uint8)
+        newlines = np.flatnonzero(data == NEWLINE)
+        starts = np.empty_like(newlines)
+        starts[0] = 0
+        starts[1:] = newlines[:-1] + 1
+        # Пустые строки (в том числе состоящие только из '\r') пропускаются
+        lengths = newlines - starts - (data[np.maximum(newlines - 1, 0)] == ord('\r'))
+        keep = lengths > 0
+        starts, newlines = starts[keep], newlines[keep]
+        if not len(starts):
+            return width
+
+        separators = np.flatnonzero(data == SEPARATOR)
+        counts = np.diff(np.searchsorted(separators, np.concatenate(([0], newlines))))
+        if width is None:
+            width = int(counts[0]) + 1
+        if np.any(counts != width - 1):
+            raise ValueError("Строки CSV имеют разное количество столбцов.")
+
+        tokens = np.sort(np.concatenate((starts, separators + 1))).reshape(len(starts), width)
+        row_starts.append(starts + offset)
+        row_ends.append(newlines + offset)
+        checkpoints.append((tokens[:, ::stride] - starts[:, None]).astype(np.uint32))
+        return width
+
+    @classmethod
+    def cache_path(cls, file_path, cache_dir=None):
+        """
+        Путь к файлу кэша индекса: рядом с CSV файлом или в каталоге кэша.
+        :param file_path: Путь к CSV файлу
+        :param cache_dir: Каталог кэша (по умолчанию - каталог CSV файла)
+        :return: Путь к файлу кэша
+        """
+        if cache_dir is None:
+            return file_path + cls.CACHE_SUFFIX
+        digest = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16]
+        return os.path.join(cache_dir, f"{os.path.basename(file_path)}.{digest}{cls.CACHE_SUFFIX}")
+
+    @classmethod
+    def _signature(cls, file_path, stride):
+        """
+        Подпись файла для проверки актуальности кэша: версия формата, размер, время изменения и шаг.
+        """
+        stat = os.stat(file_path)
+        return np.array([cls.CACHE_VERSION, stat.st_size, stat.st_mtime_ns, stride], dtype=np.int64)
+
+    @classmethod
+    def load_cached(cls, file_path, cache_dir=None, stride=256):
+        """
+        Загрузка индекса только из кэша, без построения.
+        :param file_path: Путь к CSV файлу
+        :param cache_dir: Каталог кэша (по умолчанию - каталог CSV файла)
+        :param stride: Шаг контрольных столбцов
+        :return: Объект RowIndex или None, если кэша нет или он устарел
+        """
+        signature = cls._signature(file_path, stride)
+        try:
+            with np.load(cls.cache_path(file_path, cache_dir)) as cached:
+                if np.array_equal(cached['signature'], signature):
+                    return cls(file_path, str(cached['frame_format']), int(cached['width']),
+                               cached['row_starts'], cached['row_ends'], cached['checkpoints'], stride)
+        except Exception:
+            pass  # Кэша нет или он поврежден (в том числе обрезан или пуст) - индекс строится заново
+        return None
+
+    @classmethod
+    def load(cls, file_path, cache_dir=None, stride=256):
+        """
+        Загрузка индекса из кэша или его построение с сохранением в кэш.
+        Кэш считается устаревшим при изменении размера или времени изменения файла.
+        :param file_path: Путь к CSV файлу
+        :param cache_dir: Каталог кэша (по умолчанию - каталог CSV файла)
+        :param stride: Шаг контрольных столбцов
+        :return: Объект RowIndex
+        """
+        index = cls.load_cached(file_path, cache_dir, stride)
+        if index is not None:
+            return index
+
+        signature = cls._signature(file_path, stride)
+        index = cls.build(file_path, stride=stride)
+        cache_file = cls.cache_path(file_path, cache_dir)
+        try:
+            if cache_dir is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+            # Запись во временный файл и атомарная замена: читатели видят либо старый, либо полный кэш
+            descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(cache_file) or '.')
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    np.savez(file, signature=signature, frame_format=index.frame_format, width=index.width,
+                             row_starts=index.row_starts, row_ends=index.row_ends, checkpoints=index.checkpoints)
+                os.replace(temporary, cache_file)
+            except BaseException:
+                os.remove(temporary)
+                raise
+        except OSError:
+            pass  # Каталог недоступен для записи - работаем без кэша
+        return index
+
+    def _buffer(self):
+        """
+        Отображение CSV файла в память (открывается при первом чтении).
+        """
+        if self._mmap is None:
+            self._file = open(self.file_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read_rows(self, rows, col_start=0, col_stop=None):
+        """
+        Чтение произвольных строк (в любом порядке) в окне столбцов.
+        :param rows: Последовательность номеров строк
+        :param col_start: Первый столбец окна
+        :param col_stop: Столбец за последним в окне (по умолчанию - ширина кадра)
+        :return: Массив uint8 формы (len(rows), ширина окна) или (..., 3) для RGB
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        col_stop = self.width if col_stop is None else min(col_stop, self.width)
+        if not 0 <= col_start < col_stop:
+            raise ValueError("Некорректное окно столбцов.")
+        if len(rows) and (rows.min() < 0 or rows.max() >= self.height):
+            raise IndexError("Номер строки вне кадра.")
+
+        # Окно расширяется до ближайших контрольных столбцов
+        first_checkpoint = col_start // self.stride
+        last_checkpoint = -(-col_stop // self.stride)
+        aligned_start = first_checkpoint * self.stride
+        aligned_stop = min(last_checkpoint * self.stride, self.width)
+
+        row_starts = self.row_starts[rows]
+        starts = row_starts + self.checkpoints[rows, first_checkpoint]
+        if aligned_stop < self.width:
+            ends = row_starts + self.checkpoints[rows, last_checkpoint]  # Включая ';' перед столбцом
+            suffix = b''
+        else:
+            ends = self.row_ends[rows]
+            suffix = b'\n'
+
+        buffer = self._buffer()
+        chunk = b''.join(buffer[start:end] + suffix for start, end in zip(starts.tolist(), ends.tolist()))
+        values = parse_tokens(chunk, len(rows), aligned_stop - aligned_start)
+        values = values[:, col_start - aligned_start:col_stop - aligned_start]
+        if self.frame_format == 'rgb':
+            return unpack_rgb(values)
+        return np.uint8(values)
+
+    def read_region(self, top, left, height, width):
+        """
+        Чтение прямоугольной области кадра.
+        :param top: Первая строка области
+        :param left: Первый столбец области
+        :param height: Высота области
+        :param width: Ширина области
+        :return: Массив пикселей области
+        """
+        bottom = min(top + height, self.height)
+        return self.read_rows(np.arange(top, bottom), left, left + width)
+
+    def read_preview(self, step):
+        """
+        Чтение уменьшенной копии кадра: каждая step-я строка и каждый step-й столбец.
+        Разбирается только каждая step-я строка файла.
+        :param step: Шаг прореживания
+        :return: Массив пикселей уменьшенного кадра
+        """
+        return np.ascontiguousarray(self.read_rows(np.arange(0, self.height, step))[:, ::step])
+
+    def close(self):
+        """
+        Закрытие отображения файла в память.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def cache_row_index(file_path, cache_dir=None, stride=256):
+    """
+    Построение индекса строк с сохранением в кэш (выполняется в фоновом процессе).
+    :param file_path: Путь к CSV файлу
+    :param cache_dir: Каталог кэша (по умолчанию - каталог CSV файла)
+    :param stride: Шаг контрольных столбцов
+    """
+    RowIndex.load(file_path, cache_dir, stride).close()
+
+
+def read_sampled_preview(file_path, rows=256):
+    """
+    Уменьшенная копия кадра без индекса строк.
+    Файл читается в rows точках, равномерно распределенных по его размеру, и в каждой
+    разбирается первая целая строка, поэтому время не зависит от размера файла.
+    Шаг по столбцам подбирается по оценке высоты кадра из средней длины строки.
+    :param file_path: Путь к CSV файлу
+    :param rows: Количество читаемых строк
+    :return: Массив пикселей уменьшенного кадра
+    """
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        first_line = file.readline()
+        if first_line.startswith(b'#'):
+            frame_format = 'rgb' if first_line.strip() == b'# rgb' else 'grayscale'
+            data_start = len(first_line)
+        else:
+            frame_format = 'grayscale'  # Заголовка нет - первая строка содержит данные
+            data_start = 0
+
+        lines, offsets = [], set()
+        for k in range(rows):
+            position = data_start + (size - data_start) * k // rows
+            file.seek(max(position - 1, data_start))
+            if position > data_start:
+                file.readline()  # Переход к началу следующей строки
+            offset = file.tell()
+            line = file.readline()
+            if offset in offsets or not line.strip():
+                continue  # Строка уже прочитана (короткий файл), конец файла или пустая строка
+            offsets.add(offset)
+            lines.append(line.rstrip(b'\r\n') + b'\n')
+
+    if not lines:
+        raise ValueError(f"Файл {file_path} не содержит данных.")
+    width = lines[0].count(b';') + 1
+    values = parse_tokens(b''.join(lines), len(lines), width)
+    height = (size - data_start) / (sum(map(len, lines)) / len(lines))  # Оценка высоты кадра
+    step = max(1.0, height / len(lines))  # Дробный шаг сохраняет пропорции кадра
+    values = np.ascontiguousarray(values[:, np.arange(0, width, step).astype(np.int64)])
+    if frame_format == 'rgb':
+        return unpack_rgb(values)
+    return np.uint8(values)
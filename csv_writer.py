@@ -0,0 +1,86 @@
+import lzma
+
+import numpy as np
+
+from csv_frame import COMPRESSED_OPENERS
+
+# Таблица четырехзначных чисел с ведущими нулями: '0000', '0001', ... '9999'
+DIGITS4 = np.array([list(f'{value:04d}'.encode()) for value in range(10000)], dtype=np.uint8)
+POWERS_OF_TEN = 10 ** np.arange(1, 9, dtype=np.int64)
+
+
+def pack_rgb(data):
+    """
+    Упаковка массива RGB в целые числа вида 0xRRGGBB.
+    :param data: Массив формы (height, width, 3) типа uint8
+    :return: Массив int64 формы (height, width)
+    """
+    data = data.astype(np.int64)
+    return (data[..., 0] << 16) | (data[..., 1] << 8) | data[..., 2]
+
+
+def format_rows(values, chunks):
+    """
+    Векторное форматирование строк чисел в байты формата CSV кадра.
+    Цифры берутся из таблицы DIGITS4 блоками по 4, ведущие нули отбрасываются маской.
+    :param values: Двумерный массив неотрицательных целых чисел
+    :param chunks: Количество блоков по 4 цифры (1 - до 9999, 2 - до 99999999)
+    :return: Байты строк, разделенных ';' и завершенных переводом строки
+    """
+    n_rows, n_cols = values.shape
+    flat = values.reshape(-1).astype(np.int64)
+    width = 4 * chunks
+
+    table = np.empty((len(flat), width + 1), dtype=np.uint8)
+    for chunk in range(chunks):
+        part = flat // 10 ** (4 * (chunks - 1 - chunk)) % 10000
+        table[:, 4 * chunk:4 * chunk + 4] = DIGITS4[part]
+    table[:, width] = ord(';')
+    table.reshape(n_rows, n_cols, width + 1)[:, -1, width] = ord('\n')  # Последнее значение строки
+
+    digits = np.searchsorted(POWERS_OF_TEN, flat, side='right') + 1  # Количество значащих цифр
+    mask = np.arange(width + 1) >= (width - digits)[:, None]
+    return table[mask].tobytes()  # Маска выбирает символы по порядку строк
+
+
+def iter_csv_chunks(data, block_rows=64):
+    """
+    Генератор байтовых блоков CSV кадра: заголовок, затем блоки по block_rows строк.
+    :param data: Массив формы (height, width) или (height, width, 3) типа uint8
+    :param block_rows: Количество строк в блоке
+    :return: Генератор байтовых строк
+    """
+    if data.ndim == 3:
+        yield b'# rgb\n'
+        for start in range(0, data.shape[0], block_rows):
+            yield format_rows(pack_rgb(data[start:start + block_rows]), chunks=2)
+    else:
+        yield b'# grayscale\n'
+        for start in range(0, data.shape[0], block_rows):
+            yield format_rows(data[start:start + block_rows], chunks=1)
+
+
+def write_csv_frame(data, target, block_rows=64, compress_level=6):
+    """
+    Запись кадра в формате, который читает csv_to_image.
+    Файлы с расширением .gz, .bz2 или .xz сжимаются потоково.
+    :param data: Массив формы (height, width) или (height, width, 3) типа uint8
+    :param target: Путь к файлу или открытый двоичный файл
+    :param block_rows: Количество строк в блоке записи
+    :param compress_level: Уровень сжатия для сжатых файлов
+    """
+    if hasattr(target, 'write'):
+        for chunk in iter_csv_chunks(data, block_rows):
+            target.write(chunk)
+        return
+
+    opener = next((opener for extension, opener in COMPRESSED_OPENERS.items() if target.endswith(extension)), None)
+    if opener is None:
+        file = open(target, 'wb')
+    elif opener is lzma.open:
+        file = lzma.open(target, 'wb', preset=compress_level)
+    else:
+        file = opener(target, 'wb', compresslevel=compress_level)
+    with file:
+        for chunk in iter_csv_chunks(data, block_rows):
+            file.write(chunk)
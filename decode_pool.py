@@ -0,0 +1,310 @@
+import os
+import shutil
+import weakref
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, InvalidStateError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+from PIL import Image
+
+from csv_frame import csv_to_array
+from csv_index import cache_row_index
+
+# Именованный сегмент без открытых дескрипторов сохраняется только в POSIX системах.
+# В Windows он удаляется при закрытии последнего дескриптора, поэтому кадры
+# передаются через отображаемые в память временные файлы.
+USE_SHARED_MEMORY = os.name == 'posix'
+
+
+class SharedFrame:
+    """
+    Кадр, размещенный в сегменте разделяемой памяти или во временном файле.
+    Процесс-обработчик записывает в него пиксели, в процесс интерфейса
+    передается только описание кадра (имя, форма, тип данных).
+    """
+
+    def __init__(self, name, shape, dtype, in_file=False):
+        """
+        :param name: Имя сегмента разделяемой памяти или путь к временному файлу .npy
+        :param shape: Форма массива пикселей
+        :param dtype: Тип данных массива пикселей
+        :param in_file: Кадр записан во временный файл, а не в сегмент
+        """
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.in_file = in_file
+        self.array = None  # Массив numpy поверх сегмента без копирования (только после attach)
+
+    def __getstate__(self):
+        # Между процессами передается только описание кадра
+        return {'name': self.name, 'shape': self.shape, 'dtype': self.dtype.str, 'in_file': self.in_file}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['shape'], state['dtype'], state['in_file'])
+
+    def attach(self):
+        """
+        Подключение к кадру и создание массива numpy поверх него без копирования.
+        Имя сегмента сразу удаляется, а сам сегмент закрывается, когда освобождается
+        последняя ссылка на массив (в том числе из изображений PIL).
+        :return: Массив пикселей
+        """
+        if self.array is None:
+            if self.in_file:
+                self.array = np.load(self.name, mmap_mode='r')
+            else:
+                shm = shared_memory.SharedMemory(name=self.name)
+                self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+                weakref.finalize(self.array, shm.close)  # Объект сегмента живет вместе с массивом
+                shm.unlink()
+        return self.array
+
+    def to_image(self):
+        """
+        Создание изображения PIL из кадра.
+        Градационное изображение ссылается на разделяемую память без копирования,
+        RGB изображение копируется, так как PIL хранит его по 4 байта на пиксель,
+        после чего сегмент можно сразу освободить.
+        :return: Объект изображения PIL
+        """
+        data = self.attach()
+        if data.ndim == 3:
+            return Image.fromarray(data, 'RGB')
+        height, width = data.shape
+        return Image.frombuffer('L', (width, height), data, 'raw', 'L', 0, 1)
+
+    def release(self):
+        """
+        Освобождение кадра. Если на него еще ссылаются изображения или массивы,
+        память освобождается вместе с последним из них.
+        """
+        attached, self.array = self.array is not None, None
+        if self.in_file:
+            try:
+                os.remove(self.name)
+            except OSError:
+                pass  # Файл уже удален или еще отображен в память (удаляется вместе с каталогом пула)
+        elif not attached:
+            try:
+                shm = shared_memory.SharedMemory(name=self.name)
+            except FileNotFoundError:
+                return  # Сегмент уже удален
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def decode_to_shared_memory(file_path, directory=None):
+    """
+    Декодирование CSV файла в новый сегмент разделяемой памяти или во временный файл.
+    Выполняется в процессе-обработчике.
+    :param file_path: Путь к CSV файлу
+    :param directory: Каталог временных файлов (None - разделяемая память)
+    :return: Описание кадра SharedFrame
+    """
+    data = csv_to_array(file_path)
+    if directory is not None:
+        descriptor, path = tempfile.mkstemp(suffix='.npy', dir=directory)
+        with os.fdopen(descriptor, 'wb') as file:
+            np.save(file, np.ascontiguousarray(data))  # Изображение PIL требует порядка строк C
+        return SharedFrame(path, data.shape, data.dtype, in_file=True)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+    except BaseException:
+        shm.close()
+        shm.unlink()  # Не оставляем сегмент при ошибке записи
+        raise
+    frame = SharedFrame(shm.name, data.shape, data.dtype)
+    shm.close()  # Сегмент остается в системе до attach() или release() в процессе интерфейса
+    return frame
+
+
+def _discard_result(future):
+    """
+    Удаление кадра, результат которого уже не будет получен.
+    :param future: Завершенная задача декодирования
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().release()
+
+
+class DecodePool:
+    """
+    Пул процессов для параллельного декодирования CSV файлов.
+    Результаты возвращаются через разделяемую память, а не через pickle.
+    Если процесс-обработчик аварийно завершается, пул пересоздается,
+    а прерванные задачи запускаются повторно.
+    """
+
+    RETRIES = 1  # Количество повторных запусков задачи после аварии процесса
+
+    def __init__(self, max_workers=None):
+        """
+        :param max_workers: Количество процессов (по умолчанию - число ядер)
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if USE_SHARED_MEMORY:
+            # Общий для всех процессов трекер удалит сегменты, если процесс аварийно завершится
+            resource_tracker.ensure_running()
+            self._directory = None
+        else:
+            self._directory = tempfile.mkdtemp(prefix='csv_frames_')
+        self._executor = self._create_executor()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pending = set()  # Задачи, результат которых еще не передан вызывающему коду
+        self._tasks = {}  # Задача -> выполняющая ее задача пула процессов
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _restart(self, broken):
+        """
+        Пересоздание пула после аварийного завершения процесса.
+        :param broken: Пул, в котором произошла авария
+        """
+        with self._lock:
+            if self._closed or self._executor is not broken:
+                return  # Пул уже пересоздан другой задачей или закрыт
+            self._executor = self._create_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, future, function, args, retries):
+        """
+        Запуск функции в пуле процессов с передачей результата в future.
+        """
+        while True:
+            executor = self._executor
+            try:
+                task = executor.submit(function, *args)
+                break
+            except BrokenProcessPool:
+                self._restart(executor)
+            except RuntimeError as e:  # Пул остановлен
+                future.set_exception(e)
+                return
+        self._tasks[future] = task
+        task.add_done_callback(lambda task: self._finish(future, task, executor, function, args, retries))
+
+    def _finish(self, future, task, executor, function, args, retries):
+        """
+        Передача результата задачи пула процессов или ее повторный запуск после аварии.
+        """
+        self._tasks.pop(future, None)
+        if future.cancelled():
+            _discard_result(task)  # Результат отмененной задачи не нужен
+            return
+        if task.cancelled():
+            future.cancel()
+            return
+        error = task.exception()
+        if isinstance(error, BrokenProcessPool) and retries > 0 and not self._closed:
+            self._restart(executor)
+            self._start(future, function, args, retries - 1)
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(task.result())
+        except InvalidStateError:
+            _discard_result(task)  # Задача отменена одновременно с завершением
+
+    def _submit(self, function, *args):
+        future = Future()
+        self._start(future, function, args, self.RETRIES)
+        return future
+
+    def submit(self, file_path):
+        """
+        Запуск декодирования одного файла.
+        :param file_path: Путь к CSV файлу
+        :return: Future с объектом SharedFrame
+        """
+        future = self._submit(decode_to_shared_memory, file_path, self._directory)
+        self._pending.add(future)
+        return future
+
+    def build_index(self, file_path, cache_dir=None):
+        """
+        Построение индекса строк файла с сохранением в кэш в фоновом процессе.
+        :param file_path: Путь к CSV файлу
+        :param cache_dir: Каталог кэша индексов
+        :return: Future без результата
+        """
+        return self._submit(cache_row_index, file_path, cache_dir)
+
+    def result(self, future):
+        """
+        Получение результата задачи. После этого за освобождение кадра отвечает вызывающий код.
+        :param future: Задача, возвращенная submit()
+        :return: Объект SharedFrame
+        """
+        frame = future.result()
+        self._pending.discard(future)
+        return frame
+
+    def decode(self, file_paths):
+        """
+        Декодирование файлов с сохранением порядка.
+        При прерывании генератора оставшиеся задачи отменяются, а их кадры удаляются.
+        :param file_paths: Список путей к CSV файлам
+        :return: Генератор объектов SharedFrame
+        """
+        futures = [self.submit(path) for path in file_paths]
+        try:
+            for future in futures:
+                yield self.result(future)
+        finally:
+            self.cancel_futures(futures)
+
+    def cancel_futures(self, futures):
+        """
+        Отмена задач, результат которых не был получен.
+        Кадры задач, которые уже выполняются, удаляются после их завершения.
+        :param futures: Список задач
+        """
+        for future in futures:
+            if future in self._pending:
+                self._pending.discard(future)
+                task = self._tasks.get(future)
+                if task is not None:
+                    task.cancel()  # Задача еще не начата - процесс ее не выполнит
+                future.cancel()
+                future.add_done_callback(_discard_result)
+
+    def cancel(self):
+        """
+        Отмена всех незавершенных задач декодирования.
+        """
+        self.cancel_futures(list(self._pending))
+
+    def shutdown(self):
+        """
+        Остановка пула процессов с удалением неполученных кадров.
+        """
+        self.cancel()
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -1,14 +1,27 @@
+import os
 import sys
-import pandas as pd
 import numpy as np
 from PIL import Image
-from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QPushButton, QFileDialog, QWidget, QComboBox, QSpinBox
+from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QPushButton, QFileDialog, QWidget, QComboBox, QSpinBox, \
+    QHBoxLayout, QCheckBox, QDoubleSpinBox, QProgressBar, QLineEdit, QListView
 from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt, QFile, QIODevice, QTimer
-import colormap
+from PyQt5.QtCore import Qt, QTimer, QStandardPaths, pyqtSignal
+from colormap_loader import load_color_map
+from csv_frame import csv_to_array, array_to_image
+from csv_index import RowIndex, read_sampled_preview
+from csv_writer import write_csv_frame
+from processing import ProcessingPipeline, ProcessingWorker
+from decode_pool import DecodePool
+from slideshow_export import ExportWorker
+from frame_list import FrameListModel
 
 
 class CSV_ImageViewer(QMainWindow):
+    PREVIEW_ROWS = 256  # Примерное количество строк в предварительном изображении
+    PREFETCH_FRAMES = 2  # Количество следующих кадров, декодируемых заранее во время слайд-шоу
+
+    frame_decoded = pyqtSignal(int, object)  # Номер изображения, задача декодирования
+
     def __init__(self):
         """
         Конструктор основного окна приложения.
@@ -17,7 +30,9 @@ class CSV_ImageViewer(QMainWindow):
         super().__init__()
 
         # Инициализация переменных
-        self.images = []  # Список для хранения изображений
+        self.images = []  # Список для хранения изображений (None - еще не декодировано)
+        self.file_paths = []  # Пути к CSV файлам изображений
+        self.previews = {}  # Уменьшенные изображения, показываемые до окончания декодирования
         self.image_names = []  # Список для хранения имен файлов изображений
         self.loaded_files = set()  # Множество для хранения загруженных файлов
         self.current_index = 0  # Индекс текущего изображения в списке
@@ -25,6 +40,26 @@ class CSV_ImageViewer(QMainWindow):
         self.slideshow_interval = 2000  # Интервал между сменой изображений в слайд-шоу (в миллисекундах)
         self.is_running = False  # Флаг, указывающий на состояние слайд-шоу
         self.slideshow_timer = QTimer(self)  # Таймер для слайд-шоу
+        self.decode_pool = None  # Пул процессов для декодирования (создается при первой загрузке)
+        self.shared_frames = {}  # Индекс изображения -> сегмент разделяемой памяти с градационным кадром
+        self.export_worker = None  # Фоновый поток экспорта слайд-шоу
+        self.frame_list_model = FrameListModel(self)  # Модель списка изображений
+        self.pending_index = None  # Изображение, выбранное в списке и ожидающее отображения
+        self.switch_timer = QTimer(self)  # Таймер для отложенного переключения при прокрутке списка
+        self.switch_timer.setSingleShot(True)
+        self.switch_timer.setInterval(150)
+        self.switch_timer.timeout.connect(lambda: self.switch_image(self.pending_index))
+        self.refine_futures = {}  # Индекс изображения -> задача декодирования в полном разрешении
+        self.frame_decoded.connect(self.finish_refine)
+        self.processing = ProcessingPipeline()  # Цепочка обработки с кэшем промежуточных результатов
+        self.processing_generation = 0  # Номер последнего запроса обработки
+        self.processing_workers = set()  # Выполняющиеся потоки обработки
+        self.save_workers = set()  # Потоки обработки и записи сохраняемых изображений
+        self.dark_frame_path = None  # Путь к темновому кадру
+        self.flat_frame_path = None  # Путь к кадру плоского поля
+        # Каталог кэша индексов строк для быстрых предварительных изображений
+        self.index_cache_dir = os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation),
+                                            'CSV_image_viewer', 'row_index')
 
         # Подключение слота для переключения изображений по таймеру
         self.slideshow_timer.timeout.connect(self.next_image)
@@ -37,7 +72,7 @@ class CSV_ImageViewer(QMainWindow):
         Создает и размещает все виджеты на главном окне.
         """
         self.setWindowTitle('Просмотр изображений CSV')  # Устанавливаем заголовок окна
-        self.setFixedSize(900, 900)  # Устанавливаем фиксированный размер окна
+        self.resize(900, 900)  # Начальный размер окна (размер можно менять, изображение растягивается)
 
         # Устанавливаем стиль для основного окна
         self.setStyleSheet("""
@@ -64,7 +99,16 @@ class CSV_ImageViewer(QMainWindow):
                 background-color: white;
             }
         """)
-        self.layout.addWidget(self.image_label)
+        # Изображение занимает все свободное место, действия со всем списком изображений
+        # (загрузка, поиск, сортировка, экспорт) находятся на боковой панели справа от него
+        image_area = QHBoxLayout()
+        image_area.addWidget(self.image_label, 1)
+        self.side_panel = QWidget()
+        self.side_panel.setFixedWidth(280)
+        side_panel = QVBoxLayout(self.side_panel)
+        side_panel.setContentsMargins(0, 0, 0, 0)
+        image_area.addWidget(self.side_panel)
+        self.layout.addLayout(image_area, 1)
 
         # Создаем кнопку для загрузки CSV файлов
         self.load_button = QPushButton('Загрузить CSV')
@@ -87,7 +131,7 @@ class CSV_ImageViewer(QMainWindow):
             }
         """)
         self.load_button.clicked.connect(self.load_csv_files)  # Подключаем действие кнопки к функции загрузки файлов
-        self.layout.addWidget(self.load_button)
+        side_panel.addWidget(self.load_button)
 
         # Создаем кнопку для сохранения текущего изображения
         self.save_button = QPushButton('Сохранить изображение')
@@ -135,9 +179,26 @@ class CSV_ImageViewer(QMainWindow):
         self.apply_color_map_button.clicked.connect(self.apply_color_map)  # Подключаем обработчик для кнопки
         self.layout.addWidget(self.apply_color_map_button)
 
-        # Создаем выпадающий список для выбора изображений
-        self.file_selector = QComboBox()
-        self.file_selector.setStyleSheet("""
+        # Создаем строку поиска и выбор сортировки для списка изображений
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText('Поиск по имени')
+        self.filter_edit.setStyleSheet("""
+            QLineEdit {
+                padding: 10px;
+                border: 2px solid #003366;
+                border-radius: 5px;
+                font-family: 'Arial';
+                font-size: 14px;
+            }
+        """)
+        self.filter_edit.textChanged.connect(self.frame_list_model.set_filter)  # Фильтрация при вводе
+        side_panel.addWidget(self.filter_edit)
+        self.sort_selector = QComboBox()
+        self.sort_selector.addItem('По имени', 'name')
+        self.sort_selector.addItem('По времени изменения', 'mtime')
+        self.sort_selector.addItem('По размеру', 'size')
+        self.sort_selector.addItem('По средней яркости', 'mean')
+        self.sort_selector.setStyleSheet("""
             QComboBox {
                 padding: 10px;
                 border: 2px solid #003366;
@@ -149,8 +210,23 @@ class CSV_ImageViewer(QMainWindow):
                 border: none;
             }
         """)
-        self.file_selector.currentIndexChanged.connect(self.switch_image)  # Подключаем обработчик выбора изображения
-        self.layout.addWidget(self.file_selector)  # Добавляем выпадающий список в компоновку
+        self.sort_selector.currentIndexChanged.connect(self.sort_frames)
+        side_panel.addWidget(self.sort_selector)
+
+        # Создаем список изображений (модель отдает строки порциями по мере прокрутки)
+        self.file_selector = QListView()
+        self.file_selector.setModel(self.frame_list_model)
+        self.file_selector.setUniformItemSizes(True)  # Без измерения каждой строки
+        self.file_selector.setStyleSheet("""
+            QListView {
+                border: 2px solid #003366;
+                border-radius: 5px;
+                font-family: 'Arial';
+                font-size: 14px;
+            }
+        """)
+        self.file_selector.selectionModel().currentChanged.connect(self.schedule_switch_image)
+        side_panel.addWidget(self.file_selector, 1)  # Список занимает оставшуюся высоту панели
 
         # Создаем кнопку для запуска слайд-шоу
         self.start_slideshow_button = QPushButton('Запустить слайд-шоу')
@@ -215,28 +291,122 @@ class CSV_ImageViewer(QMainWindow):
         self.interval_spinbox.valueChanged.connect(self.update_interval)  # Подключаем изменение значения к функции обновления интервала
         self.layout.addWidget(self.interval_spinbox)
 
+        # Создаем кнопку для экспорта слайд-шоу в файл
+        self.export_button = QPushButton('Экспорт слайд-шоу')
+        self.export_button.setStyleSheet("""
+            QPushButton {
+                background-color: #003366;
+                color: white;
+                border: none;
+                padding: 10px 20px;
+                text-align: center;
+                font-family: 'Arial';
+                font-size: 14px;
+                font-weight: bold;
+                margin: 4px 2px;
+                cursor: pointer;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #002244;
+            }
+        """)
+        self.export_button.clicked.connect(self.export_slideshow)
+        side_panel.addWidget(self.export_button)
+
+        # Создаем параметры экспорта: цветовая карта и масштаб
+        self.export_color_map_checkbox = QCheckBox('Цветовая карта при экспорте')
+        self.export_color_map_checkbox.setStyleSheet("""
+            QCheckBox {
+                font-family: 'Arial';
+                font-size: 14px;
+            }
+        """)
+        side_panel.addWidget(self.export_color_map_checkbox)
+        self.export_scale_spinbox = QDoubleSpinBox()
+        self.export_scale_spinbox.setRange(0.1, 4.0)  # Диапазон масштаба экспортируемых кадров
+        self.export_scale_spinbox.setSingleStep(0.25)
+        self.export_scale_spinbox.setValue(1.0)
+        self.export_scale_spinbox.setPrefix('Масштаб: x')
+        self.export_scale_spinbox.setStyleSheet("""
+            QDoubleSpinBox {
+                padding: 10px;
+                border: 2px solid #003366;
+                border-radius: 5px;
+                font-family: 'Arial';
+                font-size: 14px;
+            }
+        """)
+        side_panel.addWidget(self.export_scale_spinbox)
+
+        # Создаем индикатор прогресса экспорта
+        self.export_progress = QProgressBar()
+        self.export_progress.setVisible(False)  # Показывается только во время экспорта
+        side_panel.addWidget(self.export_progress)
+
+        # Создаем параметры обработки: темновой кадр, плоское поле, шумоподавление и бининг
+        processing_options = QHBoxLayout()
+        self.dark_frame_button = QPushButton('Темновой кадр')
+        self.dark_frame_button.setCheckable(True)
+        self.dark_frame_button.clicked.connect(lambda: self.select_reference_frame('dark'))
+        self.flat_frame_button = QPushButton('Плоское поле')
+        self.flat_frame_button.setCheckable(True)
+        self.flat_frame_button.clicked.connect(lambda: self.select_reference_frame('flat'))
+        for button in (self.dark_frame_button, self.flat_frame_button):
+            button.setStyleSheet("""
+                QPushButton {
+                    background-color: white;
+                    color: #003366;
+                    border: 2px solid #003366;
+                    padding: 8px 12px;
+                    font-family: 'Arial';
+                    font-size: 14px;
+                    border-radius: 5px;
+                }
+                QPushButton:checked {
+                    background-color: #003366;
+                    color: white;
+                }
+            """)
+            processing_options.addWidget(button)
+        self.denoise_selector = QComboBox()
+        self.denoise_selector.addItem('Без шумоподавления', None)
+        self.denoise_selector.addItem('Медианный фильтр 3x3', ('median', 3))
+        self.denoise_selector.addItem('Гауссов фильтр, sigma=1', ('gaussian', 1.0))
+        self.binning_selector = QComboBox()
+        self.binning_selector.addItem('Без бининга', None)
+        self.binning_selector.addItem('Бининг 2x2', ('bin', 2))
+        self.binning_selector.addItem('Бининг 4x4', ('bin', 4))
+        for selector in (self.denoise_selector, self.binning_selector):
+            selector.setStyleSheet("""
+                QComboBox {
+                    padding: 8px;
+                    border: 2px solid #003366;
+                    border-radius: 5px;
+                    font-family: 'Arial';
+                    font-size: 14px;
+                }
+                QComboBox::drop-down {
+                    border: none;
+                }
+            """)
+            selector.currentIndexChanged.connect(lambda: self.show_image(self.current_index))
+            processing_options.addWidget(selector)
+        self.layout.addLayout(processing_options)
+
     def load_color_map(self):
         """
-        Загрузка цветовой карты из файла.
+        Загрузка цветовой карты из ресурсов приложения.
         Цветовая карта используется для преобразования градационных изображений в цветные.
         """
-        colormap_path = ":/colormap/CET-R1.csv"  # Путь к файлу цветовой карты
-        try:
-            file = QFile(colormap_path)
-            if file.open(QIODevice.ReadOnly):  # Попытка открыть файл для чтения
-                df = pd.read_csv(file, delimiter=',', header=None)  # Чтение CSV файла с цветовой картой
-                self.color_map = df.values.astype(np.uint8)  # Преобразование данных в формат numpy array
-                file.close()
-                print("Цветовая карта успешно загружена.")
-            else:
-                print("Не удалось открыть файл цветовой карты.")
-        except Exception as e:
-            print(f"Ошибка при загрузке цветовой карты: {e}")
+        self.color_map = load_color_map()
+        if self.color_map is not None:
+            print("Цветовая карта успешно загружена.")
 
     def load_csv_files(self):
         """
         Загрузка CSV файлов и преобразование их в изображения.
-        Обновляет выпадающий список с именами загруженных изображений.
+        Обновляет список с именами загруженных изображений.
         """
         files, _ = QFileDialog.getOpenFileNames(self, 'Открыть CSV файлы', '', 'CSV Files (*.csv)')
         if not files:
@@ -250,10 +420,11 @@ class CSV_ImageViewer(QMainWindow):
                 new_files.append(file)
 
         try:
-            # Загрузка новых файлов
-            self.images.extend(self.csv_to_image(file) for file in new_files)
+            # Изображения декодируются при первом показе, до этого показывается уменьшенная копия
+            self.images.extend([None] * len(new_files))
+            self.file_paths.extend(new_files)
             self.image_names.extend([file.split('/')[-1] for file in new_files])
-            self.file_selector.addItems([file.split('/')[-1] for file in new_files])
+            self.frame_list_model.add_frames(new_files)
             if self.image_names:
                 self.show_image(0)  # Показываем первое изображение
         except Exception as e:
@@ -274,9 +445,15 @@ class CSV_ImageViewer(QMainWindow):
 
         try:
             image = self.images[self.current_index]
-            if image.mode == 'L':  # Если изображение градационного типа
+            if image is None:
+                print("Изображение еще загружается.")
+            elif image.mode == 'L':  # Если изображение градационного типа
                 color_mapped_image = Image.fromarray(self.color_map[image], 'RGB')  # Применение цветовой карты
                 self.images[self.current_index] = color_mapped_image  # Замена изображения
+                frame = self.shared_frames.pop(self.current_index, None)
+                if frame is not None:
+                    del image
+                    frame.release()  # Градационный кадр больше не используется
                 self.show_image(self.current_index)  # Отображение обновленного изображения
             else:
                 print("Цветовая карта применяется только к градационным изображениям.")
@@ -289,26 +466,7 @@ class CSV_ImageViewer(QMainWindow):
         :param file_path: Путь к CSV файлу
         :return: Объект изображения PIL
         """
-        with open(file_path, 'r') as file:
-            first_line = file.readline().strip()  # Чтение первой строки для определения формата
-            df = pd.read_csv(file, delimiter=';', header=None)  # Чтение данных CSV
-
-        data = df.values
-        if first_line == "# rgb":  # Проверка формата файла
-            height, width = data.shape
-            rgb_data = np.zeros((height, width, 3), dtype=np.uint8)
-
-            for i in range(height):
-                for j in range(width):
-                    pixel = int(data[i, j])
-                    blue = pixel & 0xFF
-                    green = (pixel >> 8) & 0xFF
-                    red = (pixel >> 16) & 0xFF
-                    rgb_data[i, j] = [red, green, blue]
-
-            return Image.fromarray(rgb_data, 'RGB')  # Создание изображения RGB
-        else:
-            return Image.fromarray(np.uint8(data), 'L')  # Создание градационного изображения
+        return array_to_image(csv_to_array(file_path))
 
     def show_image(self, index):
         """
@@ -316,17 +474,224 @@ class CSV_ImageViewer(QMainWindow):
         :param index: Индекс изображения в списке
         """
         if 0 <= index < len(self.images):
+            self.cancel_refine(keep=self.upcoming_indexes(index))  # Пользователь перешел к другому изображению
             self.current_index = index
             image = self.images[index]
-            # Конвертирование изображения PIL в формат QImage
-            q_image = QImage(image.tobytes(), image.width, image.height, image.width * len(image.getbands()),
-                             QImage.Format_RGB888 if image.mode == 'RGB' else QImage.Format_Grayscale8)
-            pixmap = QPixmap.fromImage(q_image)
-            self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio))  # Отображение изображения с сохранением пропорций
+            if image is None:
+                image = self.previews.get(index)
+                if image is None:
+                    image = self.previews[index] = self.load_preview(index)
+                self.start_refine(index)
+            else:
+                image = self.processed_image(index, image)
+            self.prefetch(index)
+            if image is not None:
+                self.display_image(image)
+
+    def display_image(self, image):
+        """
+        Вывод изображения PIL в метку окна.
+        :param image: Объект изображения PIL
+        """
+        # Конвертирование изображения PIL в формат QImage
+        q_image = QImage(image.tobytes(), image.width, image.height, image.width * len(image.getbands()),
+                         QImage.Format_RGB888 if image.mode == 'RGB' else QImage.Format_Grayscale8)
+        pixmap = QPixmap.fromImage(q_image)
+        self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio))  # Отображение изображения с сохранением пропорций
+
+    def processing_stages(self):
+        """
+        Этапы обработки, выбранные в интерфейсе, в порядке применения.
+        :return: Список этапов для ProcessingPipeline
+        """
+        stages = []
+        if self.dark_frame_path:
+            stages.append(('dark', self.dark_frame_path))
+        if self.flat_frame_path:
+            stages.append(('flat', self.flat_frame_path))
+        for selector in (self.denoise_selector, self.binning_selector):
+            if selector.currentData() is not None:
+                stages.append(tuple(selector.currentData()))
+        return stages
+
+    def processed_image(self, index, image):
+        """
+        Обработанное изображение из кэша. Если его там нет, обработка запускается
+        в фоновом потоке, а до ее окончания возвращается исходное изображение.
+        :param index: Индекс изображения в списке
+        :param image: Исходное изображение PIL
+        :return: Объект изображения PIL
+        """
+        stages = self.processing_stages()
+        if not stages:
+            return image
+        data = self.processing.cached(image, stages)
+        if data is not None:
+            return array_to_image(data)
+
+        self.processing_generation += 1
+        for worker in self.processing_workers:
+            worker.requestInterruption()  # Результаты предыдущих запросов больше не нужны
+        worker = ProcessingWorker(self.processing, index, self.processing_generation, image, stages, self)
+        worker.processed.connect(self.finish_processing)
+        worker.failed.connect(self.fail_processing)
+        worker.finished.connect(lambda: self.processing_workers.discard(worker))
+        worker.finished.connect(worker.deleteLater)
+        self.processing_workers.add(worker)
+        worker.start()
+        return image
+
+    def finish_processing(self, index, generation, data):
+        """
+        Отображение результата фоновой обработки.
+        :param index: Индекс изображения в списке
+        :param generation: Номер запроса обработки
+        :param data: Обработанный массив uint8
+        """
+        if generation == self.processing_generation and index == self.current_index:
+            self.display_image(array_to_image(data))
+
+    def fail_processing(self, index, generation, message):
+        """
+        Сообщение об ошибке фоновой обработки.
+        """
+        if generation == self.processing_generation:
+            print(message)
+
+    def select_reference_frame(self, kind):
+        """
+        Выбор темнового кадра или кадра плоского поля. Повторное нажатие отключает этап.
+        :param kind: 'dark' или 'flat'
+        """
+        button = self.dark_frame_button if kind == 'dark' else self.flat_frame_button
+        file_path = None
+        if button.isChecked():
+            file_path, _ = QFileDialog.getOpenFileName(self, 'Открыть CSV файл', '', 'CSV Files (*.csv)')
+            button.setChecked(bool(file_path))
+        if kind == 'dark':
+            self.dark_frame_path = file_path or None
+        else:
+            self.flat_frame_path = file_path or None
+        self.show_image(self.current_index)
+
+    def load_preview(self, index):
+        """
+        Быстрое чтение уменьшенной копии изображения.
+        Если индекс строк уже есть в кэше, разбирается каждая k-я строка файла,
+        иначе - строки в равномерно распределенных точках файла без построения индекса.
+        :param index: Индекс изображения в списке
+        :return: Объект изображения PIL или None при ошибке
+        """
+        file_path = self.file_paths[index]
+        try:
+            row_index = RowIndex.load_cached(file_path, self.index_cache_dir)
+            if row_index is None:
+                return array_to_image(read_sampled_preview(file_path, self.PREVIEW_ROWS))
+            with row_index:
+                step = max(2, row_index.height // self.PREVIEW_ROWS)
+                return array_to_image(row_index.read_preview(step))
+        except Exception as e:
+            print(f"Ошибка при загрузке предварительного изображения: {e}")
+            return None
+
+    def upcoming_indexes(self, index):
+        """
+        Изображения, которые понадобятся в ближайшее время: текущее и, во время слайд-шоу, следующие за ним.
+        :param index: Индекс текущего изображения
+        :return: Множество индексов изображений
+        """
+        count = self.PREFETCH_FRAMES if self.is_running else 0
+        return {(index + offset) % len(self.images) for offset in range(count + 1)}
+
+    def prefetch(self, index):
+        """
+        Заблаговременное декодирование следующих кадров слайд-шоу,
+        чтобы к их показу изображение в полном разрешении было уже готово.
+        :param index: Индекс текущего изображения
+        """
+        if self.is_running:
+            for offset in range(1, self.PREFETCH_FRAMES + 1):
+                next_index = (index + offset) % len(self.images)
+                if self.images[next_index] is None:
+                    self.start_refine(next_index)
+
+    def start_refine(self, index):
+        """
+        Запуск декодирования изображения в полном разрешении в фоновом процессе.
+        :param index: Индекс изображения в списке
+        """
+        if index in self.refine_futures:
+            return  # Изображение уже декодируется
+        try:
+            if self.decode_pool is None:
+                self.decode_pool = DecodePool()
+            future = self.decode_pool.submit(self.file_paths[index])
+        except Exception as e:
+            print(f"Ошибка при загрузке файла: {e}")  # Остается уменьшенная копия
+            return
+        self.refine_futures[index] = future
+        # Результат передается в поток интерфейса через сигнал
+        future.add_done_callback(lambda future: self.frame_decoded.emit(index, future))
+
+    def cancel_refine(self, keep=()):
+        """
+        Отмена декодирования изображений, от которых пользователь ушел.
+        :param keep: Индексы изображений, декодирование которых продолжается
+        """
+        cancelled = [index for index in self.refine_futures if index not in keep]
+        if cancelled:
+            self.decode_pool.cancel_futures([self.refine_futures.pop(index) for index in cancelled])
+
+    def finish_refine(self, index, future):
+        """
+        Замена уменьшенной копии изображением в полном разрешении.
+        :param index: Индекс изображения в списке
+        :param future: Задача декодирования
+        """
+        if self.refine_futures.get(index) is not future:
+            return  # Задача отменена, ее сегмент удаляет пул
+        del self.refine_futures[index]
+        try:
+            frame = self.decode_pool.result(future)
+        except Exception as e:
+            print(f"Ошибка при загрузке файла: {e}")
+            return
+        self.frame_list_model.set_mean(index, frame.attach().mean())  # Статистика для сортировки списка
+        self.images[index] = frame.to_image()
+        if self.images[index].mode == 'RGB':
+            frame.release()  # RGB изображение скопировано, сегмент больше не нужен
+        else:
+            self.shared_frames[index] = frame  # Градационное изображение ссылается на сегмент
+        self.previews.pop(index, None)
+        if index == self.current_index:
+            self.show_image(index)  # Обновление на месте
+        if not self.is_running:  # Во время слайд-шоу процессы заняты декодированием следующих кадров
+            try:
+                # Индекс строк для точных уменьшенных копий при следующих запусках
+                self.decode_pool.build_index(self.file_paths[index], self.index_cache_dir)
+            except Exception as e:
+                print(f"Ошибка при построении индекса строк: {e}")
+
+    def schedule_switch_image(self, current, previous):
+        """
+        Отложенное переключение изображения при выборе в списке.
+        При быстрой прокрутке отображается только последнее выбранное изображение.
+        :param current: Индекс выбранной строки в модели
+        :param previous: Индекс ранее выбранной строки в модели
+        """
+        if current.isValid():
+            self.pending_index = self.frame_list_model.frame_index(current.row())
+            self.switch_timer.start()  # Перезапуск таймера откладывает отображение
+
+    def sort_frames(self):
+        """
+        Сортировка списка изображений по выбранному ключу.
+        """
+        self.frame_list_model.sort_by(self.sort_selector.currentData())
 
     def switch_image(self, index):
         """
-        Переключение изображения при выборе из выпадающего списка.
+        Переключение изображения при выборе из списка.
         :param index: Индекс выбранного изображения
         """
         self.show_image(index)
@@ -338,11 +703,49 @@ class CSV_ImageViewer(QMainWindow):
         if not self.images:
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(self, 'Сохранить изображение', '', 'Image Files (*.jpg *.png *.bmp)')
+        if self.images[self.current_index] is None:
+            print("Изображение еще загружается.")
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(self, 'Сохранить изображение', '',
+                                                   'Image Files (*.jpg *.png *.bmp);;CSV Files (*.csv *.csv.gz)')
         if not file_path:
             return
 
-        self.images[self.current_index].save(file_path)  # Сохранение изображения по указанному пути
+        image = self.images[self.current_index]
+        stages = self.processing_stages()
+        if not stages:
+            self.write_image(image, file_path)
+            return
+
+        data = self.processing.cached(image, stages)
+        if data is not None:
+            self.write_image(array_to_image(data), file_path)  # Сохраняется обработанное изображение
+            return
+
+        # Обработки нет в кэше: она и запись файла выполняются в фоновом потоке
+        worker = ProcessingWorker(self.processing, self.current_index, 0, image, stages, self)
+        worker.processed.connect(lambda index, generation, data: self.write_image(array_to_image(data), file_path),
+                                 Qt.DirectConnection)
+        worker.failed.connect(lambda index, generation, message: print(message))
+        worker.finished.connect(lambda: self.save_workers.discard(worker))
+        worker.finished.connect(worker.deleteLater)
+        self.save_workers.add(worker)
+        worker.start()
+
+    def write_image(self, image, file_path):
+        """
+        Запись изображения в файл (вызывается и из фонового потока).
+        :param image: Объект изображения PIL
+        :param file_path: Путь к файлу
+        """
+        try:
+            if file_path.endswith(('.csv', '.csv.gz')):
+                write_csv_frame(np.asarray(image), file_path)  # Сохранение в формате CSV (# grayscale / # rgb)
+            else:
+                image.save(file_path)  # Сохранение изображения по указанному пути
+        except Exception as e:
+            print(f"Ошибка при сохранении изображения: {e}")
 
     def start_slideshow(self):
         """
@@ -354,6 +757,7 @@ class CSV_ImageViewer(QMainWindow):
 
         if not self.is_running:
             self.is_running = True
+            self.prefetch(self.current_index)  # Следующие кадры декодируются до первой смены изображения
             self.slideshow_timer.start(self.slideshow_interval)  # Запуск таймера с указанным интервалом
 
     def stop_slideshow(self):
@@ -382,6 +786,85 @@ class CSV_ImageViewer(QMainWindow):
         if self.is_running:
             self.slideshow_timer.setInterval(self.slideshow_interval)  # Установка нового интервала для таймера
 
+    def export_slideshow(self):
+        """
+        Экспорт слайд-шоу в анимированный PNG, GIF или последовательность кадров.
+        Повторное нажатие во время экспорта отменяет его.
+        """
+        if self.export_worker is not None:
+            self.export_worker.requestInterruption()  # Отмена текущего экспорта
+            return
+
+        if not self.images:
+            print("Нет изображений для экспорта.")
+            return
+
+        filters = {
+            'Анимированный PNG (*.png)': 'apng',
+            'GIF (*.gif)': 'gif',
+            'Последовательность PNG (*.png)': 'sequence',
+        }
+        file_path, selected_filter = QFileDialog.getSaveFileName(self, 'Экспорт слайд-шоу', '', ';;'.join(filters))
+        if not file_path:
+            return
+
+        color_map = self.color_map if self.export_color_map_checkbox.isChecked() else None
+        self.export_worker = ExportWorker(self.images, file_path, filters.get(selected_filter, 'apng'),
+                                          self.slideshow_interval, color_map, self.export_scale_spinbox.value(), self,
+                                          file_paths=self.file_paths, decode_pool=self.decode_pool)
+        self.export_worker.progress.connect(self.update_export_progress)
+        self.export_worker.export_finished.connect(self.finish_export)
+        self.export_progress.setRange(0, len(self.images))
+        self.export_progress.setValue(0)
+        self.export_progress.setVisible(True)
+        self.export_button.setText('Отменить экспорт')
+        self.export_worker.start()
+
+    def update_export_progress(self, done, total):
+        """
+        Обновление индикатора прогресса экспорта.
+        :param done: Количество записанных кадров
+        :param total: Общее количество кадров
+        """
+        self.export_progress.setMaximum(total)
+        self.export_progress.setValue(done)
+
+    def finish_export(self, completed, message):
+        """
+        Завершение экспорта слайд-шоу.
+        :param completed: Завершен ли экспорт полностью
+        :param message: Сообщение о результате
+        """
+        print(message)
+        self.export_worker.wait()
+        self.export_worker = None
+        self.export_progress.setVisible(False)
+        self.export_button.setText('Экспорт слайд-шоу')
+
+    def closeEvent(self, event):
+        """
+        Освобождение пула процессов и разделяемой памяти при закрытии окна.
+        :param event: Событие закрытия окна
+        """
+        for worker in list(self.processing_workers):
+            worker.requestInterruption()
+            worker.wait()
+        for worker in list(self.save_workers):
+            worker.wait()  # Начатое сохранение завершается
+        self.processing.clear()  # Кэш обработки ссылается на изображения в разделяемой памяти
+        if self.export_worker is not None:
+            self.export_worker.requestInterruption()
+            self.export_worker.wait()  # Экспорт использует изображения в разделяемой памяти
+        if self.decode_pool is not None:
+            self.cancel_refine()
+            self.decode_pool.shutdown()
+        self.images.clear()  # Изображения ссылаются на разделяемую память
+        self.previews.clear()
+        for frame in self.shared_frames.values():
+            frame.release()
+        self.shared_frames.clear()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)  # Создание объекта приложения
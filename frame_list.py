@@ -0,0 +1,151 @@
+import os
+import time
+
+import numpy as np
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+
+
+class FrameListModel(QAbstractListModel):
+    """
+    Модель списка кадров поверх компактных массивов метаданных.
+    Строки отдаются представлению порциями, фильтрация и сортировка
+    выполняются векторно над перестановкой номеров кадров.
+    """
+
+    BATCH_SIZE = 256  # Количество строк, добавляемых в представление за один раз
+    SORT_KEYS = ('name', 'mtime', 'size', 'mean')
+    FrameIndexRole = Qt.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []  # Имена файлов (для отображения)
+        self.names_lower = np.array([], dtype=str)  # Имена в нижнем регистре (для поиска)
+        self.mtimes = np.array([], dtype=np.float64)  # Время изменения файлов
+        self.sizes = np.array([], dtype=np.int64)  # Размеры файлов в байтах
+        self.means = np.array([], dtype=np.float32)  # Средняя яркость кадров (NaN - не вычислена)
+        self.filter_text = ''
+        self.sort_key = 'name'
+        self.descending = False
+        self.matched = np.array([], dtype=np.int64)  # Кадры, подходящие под фильтр
+        self.order = np.array([], dtype=np.int64)  # Номера кадров в порядке отображения
+        self.loaded_rows = 0  # Количество строк, уже переданных представлению
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded_rows
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded_rows < len(self.order)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.BATCH_SIZE, len(self.order) - self.loaded_rows)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded_rows, self.loaded_rows + count - 1)
+        self.loaded_rows += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded_rows:
+            return None
+        frame = int(self.order[index.row()])
+        if role == Qt.DisplayRole:
+            return self.names[frame]
+        if role == Qt.ToolTipRole:
+            mean = '' if np.isnan(self.means[frame]) else f", средняя яркость {self.means[frame]:.1f}"
+            modified = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.mtimes[frame]))
+            return f"{self.sizes[frame] / 2 ** 20:.2f} МБ, изменен {modified}{mean}"
+        if role == self.FrameIndexRole:
+            return frame
+        return None
+
+    def frame_index(self, row):
+        """
+        Номер кадра для строки списка.
+        :param row: Номер строки в представлении
+        :return: Номер кадра в списке изображений
+        """
+        return int(self.order[row])
+
+    def add_frames(self, file_paths, means=None):
+        """
+        Добавление кадров в конец списка.
+        :param file_paths: Пути к файлам кадров
+        :param means: Средняя яркость кадров или None
+        """
+        if not file_paths:
+            return
+        stats = [os.stat(path) for path in file_paths]
+        names = [os.path.basename(path) for path in file_paths]
+        start = len(self.names)
+        self.names.extend(names)
+        self.names_lower = np.concatenate((self.names_lower, np.array([name.lower() for name in names])))
+        self.mtimes = np.concatenate((self.mtimes, [stat.st_mtime for stat in stats]))
+        self.sizes = np.concatenate((self.sizes, np.array([stat.st_size for stat in stats], dtype=np.int64)))
+        new_means = np.full(len(names), np.nan, dtype=np.float32) if means is None else np.float32(means)
+        self.means = np.concatenate((self.means, new_means))
+
+        new_frames = np.arange(start, len(self.names), dtype=np.int64)
+        self.matched = np.concatenate((self.matched, new_frames[self._match(new_frames, self.filter_text)]))
+        self._update_order()
+
+    def set_mean(self, frame, value):
+        """
+        Сохранение средней яркости кадра после его декодирования.
+        Порядок строк не меняется, чтобы список не перестраивался под курсором.
+        :param frame: Номер кадра
+        :param value: Средняя яркость
+        """
+        self.means[frame] = value
+        rows = np.flatnonzero(self.order[:self.loaded_rows] == frame)
+        if len(rows):
+            index = self.index(int(rows[0]))
+            self.dataChanged.emit(index, index, [Qt.ToolTipRole])
+
+    def set_filter(self, text):
+        """
+        Фильтрация кадров по подстроке имени.
+        Если новый текст продолжает предыдущий, поиск выполняется только среди уже найденных кадров.
+        :param text: Подстрока для поиска
+        """
+        text = text.lower()
+        if text.startswith(self.filter_text):
+            candidates = self.matched  # Инкрементальная фильтрация
+        else:
+            candidates = np.arange(len(self.names), dtype=np.int64)
+        self.filter_text = text
+        self.matched = candidates[self._match(candidates, text)]
+        self._update_order()
+
+    def sort_by(self, key, descending=False):
+        """
+        Сортировка кадров.
+        :param key: 'name', 'mtime', 'size' или 'mean'
+        :param descending: Сортировка по убыванию
+        """
+        if key not in self.SORT_KEYS:
+            raise ValueError(f"Неизвестный ключ сортировки: {key}")
+        self.sort_key = key
+        self.descending = descending
+        self._update_order()
+
+    def _match(self, frames, text):
+        """
+        Маска кадров, имя которых содержит подстроку.
+        """
+        if not text:
+            return np.ones(len(frames), dtype=bool)
+        return np.char.find(self.names_lower[frames], text) >= 0
+
+    def _update_order(self):
+        """
+        Пересчет порядка отображения и сброс модели.
+        """
+        keys = {'name': self.names_lower, 'mtime': self.mtimes, 'size': self.sizes, 'mean': self.means}
+        values = keys[self.sort_key][self.matched]
+        order = self.matched[np.argsort(values, kind='stable')]
+        if self.descending:
+            order = order[::-1]
+        self.beginResetModel()
+        self.order = order
+        self.loaded_rows = min(self.BATCH_SIZE, len(order))
+        self.endResetModel()
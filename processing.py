@@ -0,0 +1,268 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from csv_frame import csv_to_array
+
+
+def bin_frame(data, factor):
+    """
+    Бининг factor x factor: среднее по блокам пикселей.
+    Строки и столбцы, не входящие в целый блок, отбрасываются.
+    :param data: Массив формы (height, width) или (height, width, 3)
+    :param factor: Размер блока
+    :return: Уменьшенный массив
+    """
+    height, width = data.shape[0] // factor * factor, data.shape[1] // factor * factor
+    blocks = data[:height, :width].reshape(height // factor, factor, width // factor, factor, *data.shape[2:])
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+def _shifted(data, radius, dy, dx):
+    """
+    Сдвинутое окно кадра, дополненного крайними значениями на radius пикселей.
+    """
+    height, width = data.shape[0] - 2 * radius, data.shape[1] - 2 * radius
+    return data[radius + dy:radius + dy + height, radius + dx:radius + dx + width]
+
+
+def median_filter(data, size=3, band_rows=128):
+    """
+    Медианный фильтр size x size.
+    Кадр обрабатывается полосами, чтобы стопка сдвинутых копий не занимала много памяти.
+    :param data: Массив формы (height, width) или (height, width, 3)
+    :param size: Размер окна (нечетный)
+    :param band_rows: Количество строк в полосе
+    :return: Отфильтрованный массив float32
+    """
+    radius = size // 2
+    padding = [(radius, radius), (radius, radius)] + [(0, 0)] * (data.ndim - 2)
+    padded = np.pad(data.astype(np.float32, copy=False), padding, mode='edge')
+    result = np.empty(data.shape, dtype=np.float32)
+    offsets = range(-radius, radius + 1)
+    for start in range(0, data.shape[0], band_rows):
+        band = padded[start:start + min(band_rows, data.shape[0] - start) + 2 * radius]
+        stack = np.stack([_shifted(band, radius, dy, dx) for dy in offsets for dx in offsets])
+        result[start:start + stack.shape[1]] = np.median(stack, axis=0)
+    return result
+
+
+def gaussian_filter(data, sigma=1.0):
+    """
+    Гауссово размытие: разделимая свертка по строкам и столбцам.
+    :param data: Массив формы (height, width) или (height, width, 3)
+    :param sigma: Стандартное отклонение ядра в пикселях
+    :return: Отфильтрованный массив float32
+    """
+    radius = max(1, int(np.ceil(3 * sigma)))
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2).astype(np.float32)
+    kernel /= kernel.sum()
+    result = data.astype(np.float32, copy=False)
+    for axis in (0, 1):
+        padding = [(0, 0)] * result.ndim
+        padding[axis] = (radius, radius)
+        padded = np.pad(result, padding, mode='edge')
+        length = result.shape[axis]
+        window = [slice(None)] * result.ndim
+        result = np.zeros(result.shape, dtype=np.float32)
+        for k, weight in enumerate(kernel):  # Сумма сдвинутых копий вместо попиксельной свертки
+            window[axis] = slice(k, k + length)
+            result += weight * padded[tuple(window)]
+    return result
+
+
+def subtract_dark(data, dark):
+    """
+    Вычитание темнового кадра с отсечением отрицательных значений.
+    :param data: Массив кадра
+    :param dark: Массив темнового кадра той же формы
+    :return: Массив float32
+    """
+    _check_shape(data, dark, "Темновой кадр")
+    return np.maximum(data - dark.astype(np.float32), 0)
+
+
+def flat_field(data, flat):
+    """
+    Коррекция плоского поля: деление на нормированный к среднему кадр плоского поля.
+    :param data: Массив кадра
+    :param flat: Массив кадра плоского поля той же формы
+    :return: Массив float32
+    """
+    _check_shape(data, flat, "Кадр плоского поля")
+    flat = flat.astype(np.float32)
+    return data * (flat.mean() / np.maximum(flat, 1))
+
+
+def _check_shape(data, reference, name):
+    if data.shape != reference.shape:
+        raise ValueError(f"{name} имеет размер {reference.shape}, а изображение - {data.shape}.")
+
+
+class ProcessingPipeline:
+    """
+    Цепочка обработки кадров с кэшированием промежуточных результатов.
+    Результат каждого этапа хранится по ключу (кадр, параметры всех этапов до него
+    включительно), поэтому при изменении только последнего этапа пересчитывается
+    только он. Кэш ограничен по памяти и вытесняет давно использованные результаты.
+
+    Этапы задаются кортежами:
+    ('dark', путь), ('flat', путь), ('median', размер), ('gaussian', sigma), ('bin', размер блока).
+    В ключ этапов с опорным кадром добавляется время его изменения, поэтому после
+    перезаписи темнового кадра или плоского поля результаты вычисляются заново.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        """
+        :param max_bytes: Максимальный объем кэша в байтах
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._results = OrderedDict()  # Ключ -> (массив, исходное изображение)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            self._results.move_to_end(key)
+            return entry[0]
+
+    def _put(self, key, data, source):
+        with self._lock:
+            if key in self._results:
+                return
+            # Ссылка на исходное изображение не дает переиспользовать его id в ключе
+            self._results[key] = (data, source)
+            self.size += data.nbytes
+            while self.size > self.max_bytes and len(self._results) > 1:
+                _, (evicted, _) = self._results.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def _reference(self, file_path):
+        """
+        Темновой кадр или кадр плоского поля (кэшируется вместе с результатами).
+        """
+        key = ('reference', file_path, os.stat(file_path).st_mtime_ns)
+        data = self._get(key)
+        if data is None:
+            data = csv_to_array(file_path)
+            self._put(key, data, None)
+        return data
+
+    @staticmethod
+    def _resolve(stages):
+        """
+        Добавление времени изменения опорного кадра к этапам 'dark' и 'flat'.
+        :param stages: Список этапов
+        :return: Кортеж этапов для ключей кэша
+        """
+        resolved = []
+        for stage in stages:
+            if stage[0] in ('dark', 'flat'):
+                try:
+                    mtime = os.stat(stage[1]).st_mtime_ns
+                except OSError:
+                    mtime = None  # Ошибка чтения кадра будет получена при обработке
+                stage = (stage[0], stage[1], mtime)
+            resolved.append(stage)
+        return tuple(resolved)
+
+    def _apply(self, stage, data):
+        name, parameter = stage[:2]
+        if name == 'dark':
+            return subtract_dark(data, self._reference(parameter))
+        if name == 'flat':
+            return flat_field(data, self._reference(parameter))
+        if name == 'median':
+            return median_filter(data, parameter)
+        if name == 'gaussian':
+            return gaussian_filter(data, parameter)
+        if name == 'bin':
+            return bin_frame(data, parameter)
+        raise ValueError(f"Неизвестный этап обработки: {name}")
+
+    def cached(self, image, stages):
+        """
+        Результат обработки, если он уже есть в кэше.
+        :param image: Исходное изображение PIL
+        :param stages: Список этапов
+        :return: Массив uint8 или None
+        """
+        data = self._get(('frame', id(image), self._resolve(stages)))
+        return None if data is None else _to_uint8(data)
+
+    def run(self, image, stages, is_cancelled=None):
+        """
+        Обработка изображения с использованием кэша промежуточных результатов.
+        :param image: Исходное изображение PIL
+        :param stages: Список этапов
+        :param is_cancelled: Функция, возвращающая True для отмены между этапами, или None
+        :return: Массив uint8 или None, если обработка отменена
+        """
+        stages = self._resolve(stages)
+        # Поиск самого длинного уже вычисленного префикса цепочки
+        done, data = 0, None
+        for length in range(len(stages), 0, -1):
+            data = self._get(('frame', id(image), stages[:length]))
+            if data is not None:
+                done = length
+                break
+        if data is None:
+            data = np.asarray(image)
+
+        for length in range(done + 1, len(stages) + 1):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            data = self._apply(stages[length - 1], data)
+            data.setflags(write=False)  # Результат может использоваться из разных потоков
+            self._put(('frame', id(image), stages[:length]), data, image)
+        return _to_uint8(data)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.size = 0
+
+
+def _to_uint8(data):
+    if data.dtype == np.uint8:
+        return data
+    return np.clip(np.rint(data), 0, 255).astype(np.uint8)
+
+
+class ProcessingWorker(QThread):
+    """
+    Фоновый поток обработки одного изображения.
+    """
+
+    processed = pyqtSignal(int, int, object)  # Индекс изображения, номер запроса, массив uint8
+    failed = pyqtSignal(int, int, str)  # Индекс изображения, номер запроса, сообщение
+
+    def __init__(self, pipeline, index, generation, image, stages, parent=None):
+        """
+        :param pipeline: Объект ProcessingPipeline
+        :param index: Индекс изображения в списке
+        :param generation: Номер запроса (устаревшие результаты игнорируются)
+        :param image: Исходное изображение PIL
+        :param stages: Список этапов
+        :param parent: Родительский объект Qt
+        """
+        super().__init__(parent)
+        self.pipeline = pipeline
+        self.index = index
+        self.generation = generation
+        self.image = image
+        self.stages = stages
+
+    def run(self):
+        try:
+            data = self.pipeline.run(self.image, self.stages, is_cancelled=self.isInterruptionRequested)
+            if data is not None:
+                self.processed.emit(self.index, self.generation, data)
+        except Exception as e:
+            self.failed.emit(self.index, self.generation, f"Ошибка при обработке изображения: {e}")
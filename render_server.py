@@ -0,0 +1,339 @@
+import io
+import os
+import json
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+from PIL import Image
+
+from csv_frame import csv_to_array, array_to_image
+from csv_index import RowIndex
+from colormap_loader import load_color_map
+
+
+class FrameCache:
+    """
+    Потокобезопасный LRU кэш декодированных кадров с ограничением по памяти.
+    Одновременные запросы одного кадра декодируют его только один раз.
+    """
+
+    def __init__(self, max_bytes=512 * 2 ** 20):
+        """
+        :param max_bytes: Максимальный объем кэша в байтах
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._frames = OrderedDict()  # (путь, время изменения) -> массив пикселей
+        self._loading = {}  # (путь, время изменения) -> Future декодирования
+        self._lock = threading.Lock()
+
+    def get(self, file_path):
+        """
+        Получение кадра из кэша или его декодирование.
+        :param file_path: Путь к CSV файлу
+        :return: Массив пикселей
+        """
+        key = (file_path, os.stat(file_path).st_mtime_ns)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+
+        if not owner:
+            return future.result()  # Кадр уже декодируется другим потоком
+
+        try:
+            data = csv_to_array(file_path)
+            data.setflags(write=False)  # Кадр используется несколькими потоками
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            self._frames[key] = data
+            self.size += data.nbytes
+            while self.size > self.max_bytes and len(self._frames) > 1:
+                _, evicted = self._frames.popitem(last=False)
+                self.size -= evicted.nbytes
+        future.set_result(data)
+        return data
+
+    def peek(self, file_path):
+        """
+        Получение кадра только если он уже есть в кэше.
+        :param file_path: Путь к CSV файлу
+        :return: Массив пикселей или None
+        """
+        key = (file_path, os.stat(file_path).st_mtime_ns)
+        with self._lock:
+            data = self._frames.get(key)
+            if data is not None:
+                self._frames.move_to_end(key)
+            return data
+
+
+class RenderServer:
+    """
+    Общее состояние сервера: каталог кадров, кэш, индексы строк и цветовая карта.
+    """
+
+    def __init__(self, root, cache_bytes=512 * 2 ** 20, index_cache_dir=None, max_indexes=64):
+        """
+        :param root: Каталог с CSV кадрами
+        :param cache_bytes: Объем кэша декодированных кадров в байтах
+        :param index_cache_dir: Каталог кэша индексов строк (по умолчанию - рядом с файлами)
+        :param max_indexes: Максимальное количество открытых индексов строк
+        """
+        self.root = os.path.realpath(root)
+        self.cache = FrameCache(cache_bytes)
+        self.index_cache_dir = index_cache_dir
+        self.max_indexes = max_indexes
+        self.color_map = load_color_map()
+        self._indexes = OrderedDict()  # (путь, время изменения) -> RowIndex
+        self._indexes_loading = {}  # (путь, время изменения) -> Future построения индекса
+        self._indexes_lock = threading.Lock()
+
+    def resolve(self, relative_path):
+        """
+        Преобразование пути из запроса в путь к файлу внутри каталога кадров.
+        :param relative_path: Путь относительно каталога кадров
+        :return: Абсолютный путь
+        """
+        file_path = os.path.realpath(os.path.join(self.root, relative_path))
+        if os.path.commonpath([file_path, self.root]) != self.root or not os.path.isfile(file_path):
+            raise FileNotFoundError(relative_path)
+        return file_path
+
+    def row_index(self, file_path):
+        """
+        Индекс строк файла (строится один раз и используется всеми потоками).
+        Индексы хранятся в LRU кэше. Вытесненный индекс не закрывается явно, так как
+        другие потоки могут еще читать через него строки: файл и отображение в память
+        освобождаются вместе с последней ссылкой на индекс.
+        :param file_path: Путь к CSV файлу
+        :return: Объект RowIndex
+        """
+        key = (file_path, os.stat(file_path).st_mtime_ns)
+        with self._indexes_lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                return self._indexes[key]
+            future = self._indexes_loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._indexes_loading[key] = Future()
+
+        if not owner:
+            return future.result()  # Индекс уже строится другим потоком
+
+        try:
+            index = RowIndex.load(file_path, self.index_cache_dir)
+            index._buffer()  # Файл отображается в память до использования из разных потоков
+        except BaseException as e:
+            with self._indexes_lock:
+                del self._indexes_loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._indexes_lock:
+            del self._indexes_loading[key]
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        future.set_result(index)
+        return index
+
+    def render(self, kind, file_path, query):
+        """
+        Подготовка кадра для ответа.
+        :param kind: 'frame', 'colormap', 'preview' или 'tile'
+        :param file_path: Путь к CSV файлу
+        :param query: Параметры запроса
+        :return: Массив пикселей
+        """
+        if kind == 'tile':
+            x, y = int(query.get('x', 0)), int(query.get('y', 0))
+            width, height = int(query.get('w', 256)), int(query.get('h', 256))
+            if x < 0 or y < 0 or width <= 0 or height <= 0:
+                raise ValueError("Некорректные границы тайла.")
+            cached = self.cache.peek(file_path)
+            if cached is not None:
+                frame_height, frame_width = cached.shape[:2]
+            else:
+                index = self.row_index(file_path)
+                frame_height, frame_width = index.height, index.width
+            if x >= frame_width or y >= frame_height:
+                raise ValueError("Тайл находится за границами кадра.")
+            width, height = min(width, frame_width - x), min(height, frame_height - y)  # Обрезка по краю кадра
+            if cached is not None:
+                data = cached[y:y + height, x:x + width]
+            else:
+                data = index.read_region(y, x, height, width)  # Без разбора всего файла
+        else:
+            data = self.cache.get(file_path)
+
+        if (kind == 'colormap' or query.get('colormap') == '1') and data.ndim == 2 and self.color_map is not None:
+            data = self.color_map[data]
+
+        if kind == 'preview':
+            size = int(query.get('size', 256))
+            if size < 1:
+                raise ValueError("Размер уменьшенной копии должен быть не меньше 1.")
+            image = array_to_image(data)
+            image.thumbnail((size, size), Image.BILINEAR)
+            data = np.asarray(image)
+        return data
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов вида GET /<frame|colormap|preview|tile>/<путь к CSV>?format=png|raw.
+    """
+
+    protocol_version = 'HTTP/1.1'  # Постоянные соединения (keep-alive)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        kind, _, relative_path = url.path.lstrip('/').partition('/')
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if kind == 'health':
+            self.send_body(200, 'application/json', json.dumps({'cached_bytes': self.server.state.cache.size}).encode())
+            return
+        if kind not in ('frame', 'colormap', 'preview', 'tile'):
+            self.send_body(404, 'text/plain; charset=utf-8', b'unknown endpoint')
+            return
+
+        try:
+            file_path = self.server.state.resolve(unquote(relative_path))
+            data = self.server.state.render(kind, file_path, query)
+            if query.get('format', 'png') == 'raw':
+                headers = {'X-Width': data.shape[1], 'X-Height': data.shape[0],
+                           'X-Channels': data.shape[2] if data.ndim == 3 else 1}
+                content_type, body = 'application/octet-stream', np.ascontiguousarray(data).tobytes()
+            else:
+                buffer = io.BytesIO()
+                array_to_image(np.ascontiguousarray(data)).save(buffer, 'PNG', compress_level=1)
+                headers, content_type, body = None, 'image/png', buffer.getvalue()
+        except FileNotFoundError:
+            self.send_body(404, 'text/plain; charset=utf-8', b'frame not found')
+            return
+        except (ValueError, IndexError) as e:
+            self.send_body(400, 'text/plain; charset=utf-8', str(e).encode())
+            return
+        except Exception as e:
+            # Ошибка одного запроса не должна разрывать постоянное соединение
+            self.send_body(500, 'text/plain; charset=utf-8', f'{type(e).__name__}: {e}'.encode())
+            return
+        self.send_body(200, content_type, body, headers)
+
+    def send_body(self, status, content_type, body, headers=None):
+        """
+        Отправка ответа с телом.
+        :param status: Код ответа HTTP
+        :param content_type: Тип содержимого
+        :param body: Тело ответа
+        :param headers: Дополнительные заголовки
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Журнал каждого запроса замедляет сервер под нагрузкой
+
+
+class RenderHTTPServer(ThreadingHTTPServer):
+    """
+    Многопоточный HTTP сервер на TCP порту.
+    """
+
+    def __init__(self, address, state):
+        self.state = state
+        super().__init__(address, RenderRequestHandler)
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class UnixRenderHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """
+        Многопоточный HTTP сервер на Unix сокете.
+        """
+
+        daemon_threads = True
+
+        def __init__(self, socket_path, state):
+            self.state = state
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            super().__init__(socket_path, RenderRequestHandler)
+
+        def get_request(self):
+            request, _ = super().get_request()
+            return request, ('unix', 0)  # BaseHTTPRequestHandler ожидает адрес клиента
+
+
+def create_server(root, host='127.0.0.1', port=8765, unix_socket=None, cache_bytes=512 * 2 ** 20,
+                  index_cache_dir=None):
+    """
+    Создание сервера кадров.
+    :param root: Каталог с CSV кадрами
+    :param host: Адрес для TCP сервера
+    :param port: Порт для TCP сервера (0 - выбрать свободный)
+    :param unix_socket: Путь к Unix сокету (вместо TCP, только в системах с поддержкой AF_UNIX)
+    :param cache_bytes: Объем кэша декодированных кадров в байтах
+    :param index_cache_dir: Каталог кэша индексов строк
+    :return: Объект сервера (запуск - serve_forever())
+    """
+    state = RenderServer(root, cache_bytes, index_cache_dir)
+    if unix_socket:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Unix сокеты не поддерживаются в этой системе")
+        return UnixRenderHTTPServer(unix_socket, state)
+    return RenderHTTPServer((host, port), state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный сервер декодированных CSV кадров')
+    parser.add_argument('root', help='Каталог с CSV кадрами')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес TCP сервера')
+    parser.add_argument('--port', type=int, default=8765, help='Порт TCP сервера')
+    parser.add_argument('--unix', help='Путь к Unix сокету вместо TCP')
+    parser.add_argument('--cache-mb', type=int, default=512, help='Объем кэша кадров в мегабайтах')
+    parser.add_argument('--index-cache', help='Каталог кэша индексов строк')
+    args = parser.parse_args()
+
+    try:
+        server = create_server(args.root, args.host, args.port, args.unix, args.cache_mb * 2 ** 20, args.index_cache)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Сервер кадров запущен: {args.unix or f'http://{args.host}:{server.server_address[1]}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == '__main__':
+    main()
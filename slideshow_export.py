@@ -0,0 +1,359 @@
+import io
+import os
+import zlib
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from csv_frame import read_csv_header, open_csv
+from decode_pool import DecodePool
+
+
+def render_frame(image, color_map=None, scale=1.0, size=None):
+    """
+    Подготовка кадра к экспорту: цветовая карта, масштабирование и выравнивание по размеру.
+    :param image: Объект изображения PIL
+    :param color_map: Цветовая карта (256 x 3) для градационных изображений или None
+    :param scale: Коэффициент масштабирования
+    :param size: Размер кадра анимации (ширина, высота) или None
+    :return: Объект изображения PIL в режиме 'L', 'P' или 'RGB'
+    """
+    source = image
+    if scale != 1.0:
+        width, height = max(1, round(image.width * scale)), max(1, round(image.height * scale))
+        image = image.resize((width, height), Image.BILINEAR)
+    if size is not None and image.size != tuple(size):
+        image = ImageOps.pad(image, size)  # Вписывание с сохранением пропорций
+    if color_map is not None and image.mode == 'L':
+        image = image.copy() if image is source else image  # Исходное изображение не изменяется
+        image.putpalette(color_map.tobytes())  # Палитра вместо попиксельного преобразования
+    return image
+
+
+def _png_chunk(chunk_type, data):
+    """
+    Формирование чанка PNG.
+    """
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+class APNGWriter:
+    """
+    Потоковая запись анимированного PNG: каждый кадр сжимается и записывается сразу.
+    """
+
+    def __init__(self, file_path, size, mode, frame_count, interval, compress_level=3):
+        """
+        :param file_path: Путь к файлу
+        :param size: Размер кадров (ширина, высота)
+        :param mode: Режим кадров: 'L' или 'RGB'
+        :param frame_count: Количество кадров
+        :param interval: Длительность кадра в миллисекундах
+        :param compress_level: Уровень сжатия zlib
+        """
+        self.file_path = file_path
+        self.size = size
+        self.mode = mode
+        self.interval = interval
+        self.compress_level = compress_level
+        self.sequence = 0  # Общий номер для чанков fcTL и fdAT
+        self.frame_index = 0
+        self.file = open(file_path, 'wb')
+        width, height = size
+        color_type = 2 if mode == 'RGB' else 0
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.file.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+        self.file.write(_png_chunk(b'acTL', struct.pack('>II', frame_count, 0)))  # 0 - бесконечный повтор
+
+    def encode(self, image, index):
+        """
+        Сжатие кадра (потокобезопасно, выполняется параллельно).
+        :param image: Подготовленный кадр
+        :param index: Номер кадра
+        :return: Сжатые данные кадра
+        """
+        data = np.asarray(image.convert(self.mode), dtype=np.uint8)
+        rows = data.reshape(data.shape[0], -1)
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # Фильтр Up: разность с предыдущей строкой
+        filtered[0, 1:] = rows[0]
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        return zlib.compress(filtered.tobytes(), self.compress_level)
+
+    def write(self, payload):
+        """
+        Запись сжатого кадра в файл.
+        :param payload: Результат encode()
+        """
+        width, height = self.size
+        self.file.write(_png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', self.sequence, width, height, 0, 0,
+                                                        self.interval, 1000, 0, 0)))
+        self.sequence += 1
+        if self.frame_index == 0:
+            self.file.write(_png_chunk(b'IDAT', payload))  # Первый кадр виден и без поддержки APNG
+        else:
+            self.file.write(_png_chunk(b'fdAT', struct.pack('>I', self.sequence) + payload))
+            self.sequence += 1
+        self.frame_index += 1
+
+    def close(self):
+        self.file.write(_png_chunk(b'IEND', b''))
+        self.file.close()
+
+
+class GIFWriter:
+    """
+    Потоковая запись анимированного GIF. Каждый кадр кодируется PIL отдельно
+    и записывается со своей локальной палитрой.
+    """
+
+    def __init__(self, file_path, size, mode, frame_count, interval):
+        """
+        :param file_path: Путь к файлу
+        :param size: Размер кадров (ширина, высота)
+        :param mode: Режим кадров (не используется, палитра подбирается для каждого кадра)
+        :param frame_count: Количество кадров
+        :param interval: Длительность кадра в миллисекундах
+        """
+        self.file_path = file_path
+        self.delay = max(2, round(interval / 10))  # В сотых долях секунды
+        self.file = open(file_path, 'wb')
+        width, height = size
+        self.file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0, 0, 0))
+        self.file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')  # Бесконечный повтор
+
+    def encode(self, image, index):
+        """
+        Кодирование кадра в блок изображения GIF (потокобезопасно).
+        :param image: Подготовленный кадр
+        :param index: Номер кадра
+        :return: Дескриптор изображения с локальной палитрой и сжатыми данными
+        """
+        if image.mode == 'RGB':
+            image = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+        buffer = io.BytesIO()
+        image.save(buffer, 'GIF')
+        data = buffer.getvalue()
+
+        packed = data[10]
+        position = 13
+        global_table = b''
+        if packed & 0x80:
+            table_size = 3 << ((packed & 0x07) + 1)
+            global_table = data[position:position + table_size]
+            position += table_size
+
+        while data[position] == 0x21:  # Расширения одиночного кадра пропускаются
+            position += 2
+            while data[position]:
+                position += data[position] + 1
+            position += 1
+
+        descriptor = bytearray(data[position:position + 10])
+        if not descriptor[9] & 0x80 and global_table:
+            descriptor[9] |= 0x80 | (packed & 0x07)  # Глобальная палитра становится локальной
+            return bytes(descriptor) + global_table + data[position + 10:-1]
+        return data[position:-1]
+
+    def write(self, payload):
+        """
+        Запись закодированного кадра с задержкой.
+        :param payload: Результат encode()
+        """
+        self.file.write(b'\x21\xf9\x04\x00' + struct.pack('<H', self.delay) + b'\x00\x00')
+        self.file.write(payload)
+
+    def close(self):
+        self.file.write(b'\x3b')
+        self.file.close()
+
+
+class SequenceWriter:
+    """
+    Запись кадров в пронумерованные файлы вида <имя>_00001.<расширение>.
+    """
+
+    def __init__(self, file_path, size, mode, frame_count, interval):
+        self.base, self.extension = os.path.splitext(file_path)
+        self.extension = self.extension or '.png'
+        self.digits = max(5, len(str(frame_count)))
+        self.frame_index = 0
+
+    def frame_path(self, index):
+        return f"{self.base}_{index + 1:0{self.digits}d}{self.extension}"
+
+    def encode(self, image, index):
+        image.save(self.frame_path(index), compress_level=3)  # Файлы кадров записываются параллельно
+
+    def write(self, payload):
+        self.frame_index += 1
+
+    def close(self):
+        pass
+
+
+WRITERS = {
+    'apng': APNGWriter,
+    'gif': GIFWriter,
+    'sequence': SequenceWriter,
+}
+
+
+def export_frames(images, file_path, export_format, interval, color_map=None, scale=1.0,
+                  progress=None, is_cancelled=None, max_workers=None, file_paths=None, decode_pool=None):
+    """
+    Потоковый экспорт последовательности изображений.
+    Кадры подготавливаются и сжимаются параллельно, в памяти одновременно
+    находится не более 2 * max_workers подготовленных кадров.
+    :param images: Список изображений PIL
+    :param file_path: Путь к файлу (для последовательности - шаблон имени)
+    :param export_format: 'apng', 'gif' или 'sequence'
+    :param interval: Длительность кадра в миллисекундах
+    :param color_map: Цветовая карта для градационных изображений или None
+    :param scale: Коэффициент масштабирования
+    :param progress: Функция progress(готово, всего) или None
+    :param is_cancelled: Функция, возвращающая True для отмены экспорта, или None
+    :param max_workers: Количество потоков кодирования
+    :param file_paths: Пути к CSV файлам для еще не декодированных изображений (None в images)
+    :param decode_pool: Пул DecodePool для еще не декодированных изображений
+                        (по умолчанию создается на время экспорта)
+    :return: True, если экспорт завершен, False, если отменен
+    """
+    if not images:
+        return True
+
+    own_pool = decode_pool is None and any(image is None for image in images)
+    if own_pool:
+        decode_pool = DecodePool()
+    decoding = []  # Задачи декодирования, запущенные экспортом
+
+    def submit(index):
+        future = decode_pool.submit(file_paths[index])  # Разбор CSV выполняется в процессах пула
+        decoding.append(future)
+        return future
+
+    def load(future):
+        frame = decode_pool.result(future)
+        return frame.to_image(), frame
+
+    def is_colored(index):
+        image = images[index]
+        if image is not None:
+            return image.mode != 'L'
+        with open_csv(file_paths[index]) as file:
+            return read_csv_header(file) == 'rgb'  # Формат определяется без чтения данных
+
+    def encode(index, future, image=None, frame=None):
+        """
+        Подготовка и сжатие кадра. Сегмент декодированного кадра освобождается сразу после сжатия.
+        """
+        if future is not None:
+            image, frame = load(future)
+        try:
+            return writer.encode(render_frame(image, color_map, scale, size), index)
+        finally:
+            image = None  # Изображение ссылается на сегмент разделяемой памяти
+            if frame is not None:
+                frame.release()
+
+    first_frame = None
+    completed = False
+    try:
+        if images[0] is None:
+            first_image, first_frame = load(submit(0))  # Первый кадр декодируется один раз
+        else:
+            first_image = images[0]
+        size = (max(1, round(first_image.width * scale)), max(1, round(first_image.height * scale)))
+        colored = color_map is not None or any(is_colored(index) for index in range(len(images)))
+        writer = WRITERS[export_format](file_path, size, 'RGB' if colored else 'L', len(images), interval)
+
+        max_workers = max_workers or os.cpu_count() or 1
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = deque()
+                done = 0
+                for index in range(len(images)):
+                    if is_cancelled is not None and is_cancelled():
+                        break
+                    if index == 0:
+                        task = executor.submit(encode, 0, None, first_image, first_frame)
+                    elif images[index] is None:
+                        task = executor.submit(encode, index, submit(index))
+                    else:
+                        task = executor.submit(encode, index, None, images[index])
+                    pending.append(task)
+                    if len(pending) >= 2 * max_workers:  # Ограничение числа кадров в памяти
+                        writer.write(pending.popleft().result())
+                        done += 1
+                        if progress is not None:
+                            progress(done, len(images))
+                else:
+                    while pending:
+                        writer.write(pending.popleft().result())
+                        done += 1
+                        if progress is not None:
+                            progress(done, len(images))
+                    completed = True
+                for future in pending:
+                    future.cancel()
+        finally:
+            writer.close()
+            if not completed and export_format != 'sequence':
+                os.remove(file_path)  # Незавершенный анимированный файл некорректен
+    finally:
+        # Потоки кодирования завершены: сегменты кадров, которые не будут закодированы, удаляются
+        if decode_pool is not None:
+            decode_pool.cancel_futures(decoding)
+        if first_frame is not None:
+            first_frame.release()
+        if own_pool:
+            decode_pool.shutdown()
+    return completed
+
+
+class ExportWorker(QThread):
+    """
+    Фоновый поток экспорта слайд-шоу.
+    """
+
+    progress = pyqtSignal(int, int)  # Готово кадров, всего кадров
+    export_finished = pyqtSignal(bool, str)  # Завершен ли экспорт, сообщение
+
+    def __init__(self, images, file_path, export_format, interval, color_map=None, scale=1.0, parent=None,
+                 file_paths=None, decode_pool=None):
+        """
+        :param images: Список изображений PIL (снимок на момент запуска), None - еще не декодированные
+        :param file_path: Путь к файлу
+        :param export_format: 'apng', 'gif' или 'sequence'
+        :param interval: Длительность кадра в миллисекундах
+        :param color_map: Цветовая карта или None
+        :param scale: Коэффициент масштабирования
+        :param parent: Родительский объект Qt
+        :param file_paths: Пути к CSV файлам для еще не декодированных изображений
+        :param decode_pool: Пул DecodePool для декодирования этих изображений или None
+        """
+        super().__init__(parent)
+        self.images = list(images)
+        self.file_paths = list(file_paths) if file_paths is not None else None
+        self.decode_pool = decode_pool
+        self.file_path = file_path
+        self.export_format = export_format
+        self.interval = interval
+        self.color_map = color_map
+        self.scale = scale
+
+    def run(self):
+        try:
+            completed = export_frames(self.images, self.file_path, self.export_format, self.interval,
+                                      self.color_map, self.scale, progress=self.progress.emit,
+                                      is_cancelled=self.isInterruptionRequested, file_paths=self.file_paths,
+                                      decode_pool=self.decode_pool)
+            message = "Экспорт завершен." if completed else "Экспорт отменен."
+            self.export_finished.emit(completed, message)
+        except Exception as e:
+            self.export_finished.emit(False, f"Ошибка при экспорте: {e}")